@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -74,10 +75,26 @@ WSGI_APPLICATION = 'LibraryProject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Run on every new SQLite connection.
+SQLITE_PRAGMAS = ['mmap_size=67108864', 'cache_size=-8000', 'temp_store=MEMORY']
+# journal_mode is stored in the database file, so WAL (with relaxed fsync)
+# is opt-in: set SQLITE_WAL=1 in production, and leave it unset to keep the
+# db.sqlite3 checked into the repository as it is.
+SQLITE_WAL = os.environ.get('SQLITE_WAL') == '1'
+if SQLITE_WAL:
+    SQLITE_PRAGMAS = ['journal_mode=WAL', 'synchronous=NORMAL'] + SQLITE_PRAGMAS
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Write transactions take the lock up front and wait for it rather
+        # than failing as "database is locked".
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {pragma}' for pragma in SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
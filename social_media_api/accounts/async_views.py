@@ -0,0 +1,14 @@
+from django.contrib.auth import get_user_model
+
+from social_media_api.async_api import async_api_view, render
+
+from .serializers import UserSerializer
+
+User = get_user_model()
+
+
+@async_api_view
+async def profile(request):
+    # request.user may come from the token cache; read fresh counters.
+    user = await User.objects.aget(pk=request.user.pk)
+    return await render(UserSerializer, user, request)
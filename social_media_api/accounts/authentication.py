@@ -0,0 +1,167 @@
+"""
+Token authentication with a two-level cache.
+
+``CachedTokenAuthentication`` is a drop-in replacement for DRF's
+``TokenAuthentication``. Resolved tokens are kept in a bounded in-process
+LRU (level 1) in front of the Django cache (level 2), so most requests skip
+the Token/User join entirely. Every request gets its own copy of the
+cached token and user, so a view may modify ``request.user`` freely.
+
+Deleting a token or saving its user (see ``accounts.signals``) drops the
+entry from the Django cache and from the LRU of the process that made the
+change. Other processes keep their LRU entry for up to
+``TOKEN_CACHE_LOCAL_TTL`` seconds. That is how long a revoked token or a
+deactivated user can still authenticate against another worker. Level 2
+is only used when the Django cache is shared between processes (see
+``social_media_api.caches``), and its entries expire after
+``TOKEN_CACHE_TTL`` seconds.
+
+Bulk changes such as ``User.objects.update(is_active=False)`` send no
+signals. Call ``token_cache.clear()`` after them, or they take effect only
+once the entries expire.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from social_media_api.caches import is_shared
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _fresh(token):
+    """A per-request copy of a cached token and its user."""
+    token = copy.copy(token)
+    token.user = copy.copy(token.user)
+    return token
+
+
+class TokenCache:
+    def __init__(self, maxsize=None, ttl=None, local_ttl=None):
+        self.maxsize = maxsize if maxsize is not None else _setting('TOKEN_CACHE_MAXSIZE', 10000)
+        self.ttl = ttl if ttl is not None else _setting('TOKEN_CACHE_TTL', 60)
+        self.local_ttl = local_ttl if local_ttl is not None else _setting('TOKEN_CACHE_LOCAL_TTL', 5)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_key(key):
+        # Never put raw token keys into a shared cache.
+        return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, token = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _fresh(token)
+                del self._entries[key]
+
+        token = cache.get(self.cache_key(key)) if is_shared() else None
+        if token is not None:
+            self._remember(key, token, now)
+            with self._lock:
+                self.shared_hits += 1
+            return _fresh(token)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, token):
+        if is_shared():
+            cache.set(self.cache_key(key), token, self.ttl)
+        self._remember(key, _fresh(token), time.monotonic())
+
+    def _remember(self, key, token, now):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (now + min(self.local_ttl, self.ttl), token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        cache.delete(self.cache_key(key))
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            for key in self._entries:
+                cache.delete(self.cache_key(key))
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+            }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            token_cache.set(key, token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        return (token.user, token)
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of ``authenticate`` for views on the event loop.
+
+        Cache hits never touch the database; misses use ``aget``.
+        """
+        auth = request.headers.get('Authorization', '').split()
+        if not auth or auth[0].lower() != self.keyword.lower():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        key = auth[1]
+        token = token_cache.get(key)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = await model.objects.select_related('user').aget(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            token_cache.set(key, token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        return (token.user, token)
@@ -0,0 +1,300 @@
+"""
+In-memory follow graph.
+
+The ``following`` through table is loaded into two CSR (compressed sparse
+row) structures, one for outgoing and one for incoming edges. Each is an
+``indptr`` array indexed by user id and an ``indices`` array of neighbour
+ids, sorted within each row, so a user's edges are one slice and an edge
+lookup is a binary search. A million edges take about 8 MB for both
+directions.
+
+``follow_user`` and ``unfollow_user`` apply their change on commit to a
+small overlay of added and removed edges. Once the overlay holds
+``FOLLOW_GRAPH_MAX_CHANGES`` edges, or the snapshot is older than
+``FOLLOW_GRAPH_TTL`` seconds, the next read starts a rebuild on a
+background thread and goes on with the current snapshot. Changes made
+during the rebuild are replayed onto the new snapshot before it is swapped
+in. Only the very first read loads the table on the request path. Each
+process keeps its own copy, so follows made in another worker show up
+after about ``FOLLOW_GRAPH_TTL`` seconds.
+"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Max
+
+User = get_user_model()
+Follow = User.following.through
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class CSR:
+    """Adjacency lists of nodes ``0..size-1`` packed into two int arrays."""
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_sorted_edges(cls, edges, size, typecode):
+        """Build from ``(node, neighbour)`` pairs sorted by node, then neighbour."""
+        indptr = array('q', [0])
+        indices = array(typecode)
+        for node, neighbour in edges:
+            while len(indptr) <= node:
+                indptr.append(len(indices))
+            indices.append(neighbour)
+            # Covers users created after ``size`` was read.
+            size = max(size, neighbour + 1)
+        while len(indptr) <= size:
+            indptr.append(len(indices))
+        return cls(indptr, indices)
+
+    def transpose(self):
+        """The reversed graph, built with a counting sort in O(V + E)."""
+        size = len(self.indptr) - 1
+        counts = array('q', bytes(8 * (size + 1)))
+        for neighbour in self.indices:
+            counts[neighbour + 1] += 1
+        for node in range(size):
+            counts[node + 1] += counts[node]
+        indices = array(self.indices.typecode, bytes(self.indices.itemsize * len(self.indices)))
+        position = array('q', counts[:-1])
+        for node in range(size):
+            for k in range(self.indptr[node], self.indptr[node + 1]):
+                neighbour = self.indices[k]
+                indices[position[neighbour]] = node
+                position[neighbour] += 1
+        return CSR(counts, indices)
+
+    def row(self, node):
+        if node < 0 or node + 1 >= len(self.indptr):
+            return ()
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def degree(self, node):
+        if node < 0 or node + 1 >= len(self.indptr):
+            return 0
+        return self.indptr[node + 1] - self.indptr[node]
+
+    def has_edge(self, node, neighbour):
+        if node < 0 or node + 1 >= len(self.indptr):
+            return False
+        lo, hi = self.indptr[node], self.indptr[node + 1]
+        i = bisect_left(self.indices, neighbour, lo, hi)
+        return i < hi and self.indices[i] == neighbour
+
+
+class Snapshot:
+    """One load of the follow table, plus the follows and unfollows since."""
+
+    def __init__(self, following, followers, popular):
+        self.following = following
+        self.followers = followers
+        self.popular = popular
+        self.loaded_at = time.monotonic()
+        self.added_out = defaultdict(set)
+        self.removed_out = defaultdict(set)
+        self.added_in = defaultdict(set)
+        self.removed_in = defaultdict(set)
+        self.changes = 0
+
+    def stale(self):
+        return (
+            time.monotonic() - self.loaded_at > _setting('FOLLOW_GRAPH_TTL', 300)
+            or self.changes > _setting('FOLLOW_GRAPH_MAX_CHANGES', 10000)
+        )
+
+    def followed(self, follower_id, followee_id):
+        self.changes += 1
+        if followee_id in self.removed_out[follower_id]:
+            self.removed_out[follower_id].discard(followee_id)
+            self.removed_in[followee_id].discard(follower_id)
+        elif not self.following.has_edge(follower_id, followee_id):
+            self.added_out[follower_id].add(followee_id)
+            self.added_in[followee_id].add(follower_id)
+
+    def unfollowed(self, follower_id, followee_id):
+        self.changes += 1
+        if followee_id in self.added_out[follower_id]:
+            self.added_out[follower_id].discard(followee_id)
+            self.added_in[followee_id].discard(follower_id)
+        elif self.following.has_edge(follower_id, followee_id):
+            self.removed_out[follower_id].add(followee_id)
+            self.removed_in[followee_id].add(follower_id)
+
+
+class FollowGraph:
+    POPULAR_SIZE = 100
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._snapshot = None
+            # Changes seen while a background rebuild runs; None when idle.
+            self._pending = None
+
+    @classmethod
+    def _build(cls):
+        size = (User.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        typecode = 'i' if size < 2 ** 31 else 'q'
+        edges = (
+            Follow.objects.order_by('from_user_id', 'to_user_id')
+            .values_list('from_user_id', 'to_user_id')
+            .iterator(chunk_size=10000)
+        )
+        following = CSR.from_sorted_edges(edges, size, typecode)
+        followers = following.transpose()
+        popular = heapq.nlargest(cls.POPULAR_SIZE, range(size), key=followers.degree)
+        return Snapshot(following, followers, popular)
+
+    def load(self):
+        """Load the follow table now, on the calling thread."""
+        with self._lock:
+            self._snapshot = self._build()
+
+    def _rebuild(self):
+        try:
+            snapshot = self._build()
+            with self._lock:
+                # Changes committed during the build may or may not be in
+                # it; replaying them in order gives the same result either way.
+                for method, follower_id, followee_id in self._pending:
+                    getattr(snapshot, method)(follower_id, followee_id)
+                self._snapshot = snapshot
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _rebuild_in_background(self):
+        try:
+            self._rebuild()
+        finally:
+            # The thread's own connections, which nothing else will close.
+            connections.close_all()
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                # Another thread may have loaded while we waited.
+                if self._snapshot is None:
+                    self.load()
+                return self._snapshot
+        if snapshot.stale():
+            with self._lock:
+                if self._pending is None:
+                    self._pending = []
+                    threading.Thread(target=self._rebuild_in_background, name='follow-graph-rebuild', daemon=True).start()
+        return snapshot
+
+    # Incremental updates, called on commit of a follow or unfollow.
+
+    def _apply(self, method, follower_id, followee_id):
+        with self._lock:
+            if self._snapshot is None:
+                return
+            getattr(self._snapshot, method)(follower_id, followee_id)
+            if self._pending is not None:
+                self._pending.append((method, follower_id, followee_id))
+
+    def followed(self, follower_id, followee_id):
+        self._apply('followed', follower_id, followee_id)
+
+    def unfollowed(self, follower_id, followee_id):
+        self._apply('unfollowed', follower_id, followee_id)
+
+    # Queries
+
+    def _neighbours(self, csr, added, removed, node):
+        with self._lock:
+            extra = added.get(node)
+            gone = removed.get(node)
+            extra = set(extra) if extra else ()
+            gone = set(gone) if gone else ()
+        result = set(csr.row(node))
+        if gone:
+            result -= gone
+        if extra:
+            result |= extra
+        return result
+
+    def _following(self, snapshot, user_id):
+        return self._neighbours(snapshot.following, snapshot.added_out, snapshot.removed_out, user_id)
+
+    @staticmethod
+    def _follower_count(snapshot, user_id):
+        return (
+            snapshot.followers.degree(user_id)
+            + len(snapshot.added_in.get(user_id, ()))
+            - len(snapshot.removed_in.get(user_id, ()))
+        )
+
+    def following(self, user_id):
+        return self._following(self._current(), user_id)
+
+    def followers(self, user_id):
+        snapshot = self._current()
+        return self._neighbours(snapshot.followers, snapshot.added_in, snapshot.removed_in, user_id)
+
+    def follower_count(self, user_id):
+        return self._follower_count(self._current(), user_id)
+
+    def is_following(self, follower_id, followee_id):
+        snapshot = self._current()
+        if followee_id in snapshot.added_out.get(follower_id, ()):
+            return True
+        if followee_id in snapshot.removed_out.get(follower_id, ()):
+            return False
+        return snapshot.following.has_edge(follower_id, followee_id)
+
+    def is_mutual(self, user_id, other_id):
+        return self.is_following(user_id, other_id) and self.is_following(other_id, user_id)
+
+    def suggestions(self, user_id, limit=10):
+        """
+        Accounts followed by the people ``user_id`` follows, as
+        ``(user_id, mutual_count)`` pairs ranked by how many of them follow
+        the account, then by follower count. Topped up with the most
+        followed accounts when there are too few.
+        """
+        # One snapshot throughout, even if a rebuild is swapped in meanwhile.
+        snapshot = self._current()
+        following = self._following(snapshot, user_id)
+        excluded = following | {user_id}
+
+        mutual = Counter()
+        for friend in following:
+            mutual.update(self._following(snapshot, friend))
+        for account in excluded:
+            mutual.pop(account, None)
+
+        ranked = heapq.nlargest(
+            limit,
+            mutual.items(),
+            key=lambda item: (item[1], self._follower_count(snapshot, item[0]), -item[0])
+        )
+        if len(ranked) < limit:
+            seen = excluded | {account for account, _ in ranked}
+            for account in snapshot.popular:
+                if len(ranked) >= limit:
+                    break
+                if account not in seen and self._follower_count(snapshot, account) > 0:
+                    ranked.append((account, 0))
+        return ranked
+
+
+follow_graph = FollowGraph()
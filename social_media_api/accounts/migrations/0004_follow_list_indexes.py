@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+# The auto-created `following` through table can't declare Meta.indexes,
+# so the indexes that back keyset-paginated follower/following lists
+# (filter on one side, order by the through id) are created here.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX accounts_follow_followers_idx '
+            'ON accounts_user_following (to_user_id, id)',
+            'DROP INDEX accounts_follow_followers_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX accounts_follow_following_idx '
+            'ON accounts_user_following (from_user_id, id)',
+            'DROP INDEX accounts_follow_following_idx',
+        ),
+    ]
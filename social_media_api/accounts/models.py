@@ -17,5 +17,10 @@ class User(AbstractUser):
         blank=True
     )
 
+    # Denormalized counters, kept current with F() updates in the follow
+    # views and repaired by `manage.py reconcile_counters`.
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.username
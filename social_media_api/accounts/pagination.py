@@ -0,0 +1,6 @@
+from social_media_api.pagination import KeysetPagination
+
+
+class FollowPagination(KeysetPagination):
+    # Through-table id: most recent follows first.
+    ordering = ('-id',)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
+from django.conf import settings
 
 User = get_user_model()
 
@@ -14,7 +15,43 @@ class UserSerializer(serializers.ModelSerializer):
             'email',
             'bio',
             'profile_picture',
+            'follower_count',
+            'following_count',
         ]
+        read_only_fields = ['follower_count', 'following_count']
+
+
+class SuggestionSerializer(serializers.ModelSerializer):
+    # Number of accounts the requesting user follows that follow this one.
+    mutual_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = [
+            'id',
+            'username',
+            'bio',
+            'profile_picture',
+            'follower_count',
+            'mutual_count',
+        ]
+
+    def get_mutual_count(self, user):
+        return self.context['mutual_counts'].get(user.pk, 0)
+
+
+class BulkFollowSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    usernames = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+
+    def validate(self, attrs):
+        total = len(attrs['user_ids']) + len(attrs['usernames'])
+        limit = getattr(settings, 'FOLLOW_BULK_MAX', 500)
+        if not total:
+            raise serializers.ValidationError('Provide user_ids or usernames.')
+        if total > limit:
+            raise serializers.ValidationError(f'At most {limit} users per request.')
+        return attrs
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    token_cache.discard(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_saved_user_tokens(sender, instance, created, **kwargs):
+    # Cached tokens carry a copy of the user; drop it so changes such as
+    # deactivation take effect on the next request.
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        token_cache.discard(key)
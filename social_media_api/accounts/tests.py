@@ -1,3 +1,232 @@
-from django.test import TestCase
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from posts.models import Post, TimelineEntry
+
+from . import views
+from .authentication import TokenCache, token_cache
+from .graph import follow_graph
+
+User = get_user_model()
+Follow = User.following.through
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(username='alice', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.url = reverse('notifications-unread-count')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        # Only the unread COUNT (the test cache is per-process), no token query.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        stats = token_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(self.url)
+        self.token.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_each_request_gets_its_own_user(self):
+        token_cache.set(self.token.key, self.token)
+        first, second = token_cache.get(self.token.key), token_cache.get(self.token.key)
+        self.assertIsNot(first.user, second.user)
+        self.assertIsNot(first.user, self.token.user)
+        self.assertEqual(first.user.pk, self.user.pk)
+
+    def test_explicit_zero_settings_are_respected(self):
+        cache = TokenCache(maxsize=0)
+        cache.set(self.token.key, self.token)
+        self.assertEqual(cache.stats()['size'], 0)
+        self.assertIsNone(cache.get(self.token.key))
+
+    def test_other_workers_forget_revoked_tokens_after_local_ttl(self):
+        # A second process's LRU, which the delete signal does not reach.
+        key = self.token.key
+        other = TokenCache(local_ttl=5)
+        other.set(key, self.token)
+        self.token.delete()
+        self.assertIsNotNone(other.get(key))
+        with mock.patch('accounts.authentication.time.monotonic', return_value=time.monotonic() + 6):
+            self.assertIsNone(other.get(key))
+
+    def test_async_profile(self):
+        response = self.client.get(reverse('async-profile'))
+        self.assertEqual(response.json()['username'], 'alice')
+
+
+class FollowGraphTests(APITestCase):
+    def setUp(self):
+        follow_graph.reset()
+        self.users = {name: User.objects.create_user(username=name, password='pass') for name in 'abcdef'}
+        edges = ['ab', 'ac', 'bd', 'cd', 'ce', 'ba', 'ef']
+        for follower, followee in edges:
+            self.users[follower].following.add(self.users[followee])
+        call_command('reconcile_counters', stdout=StringIO())
+
+    def ids(self, names):
+        return {self.users[name].pk for name in names}
+
+    def test_queries_match_the_follow_table(self):
+        a, b = self.users['a'].pk, self.users['b'].pk
+        self.assertEqual(follow_graph.following(a), self.ids('bc'))
+        self.assertEqual(follow_graph.followers(self.users['d'].pk), self.ids('bc'))
+        self.assertTrue(follow_graph.is_mutual(a, b))
+        self.assertFalse(follow_graph.is_mutual(a, self.users['c'].pk))
+
+    def test_follows_are_applied_without_reloading(self):
+        a, e = self.users['a'], self.users['e']
+        follow_graph.load()
+        self.client.force_authenticate(a)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('follow-user', args=[e.pk]))
+            self.client.post(reverse('unfollow-user', args=[self.users['b'].pk]))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(follow_graph.following(a.pk), self.ids('ce'))
+            self.assertEqual(follow_graph.follower_count(e.pk), 2)
+
+    def test_stale_snapshot_is_rebuilt_in_the_background(self):
+        a, f = self.users['a'].pk, self.users['f'].pk
+        follow_graph.load()
+        with self.settings(FOLLOW_GRAPH_TTL=-1), mock.patch('accounts.graph.threading.Thread') as thread:
+            # The old snapshot is served while the rebuild runs.
+            with self.assertNumQueries(0):
+                self.assertEqual(follow_graph.following(a), self.ids('bc'))
+                follow_graph.following(a)
+            thread.assert_called_once()
+            thread.return_value.start.assert_called_once_with()
+
+        # A change made during the rebuild is replayed onto the new snapshot.
+        follow_graph.followed(a, f)
+        follow_graph._rebuild()
+        self.assertEqual(follow_graph.following(a), self.ids('bcf'))
+        self.assertIsNone(follow_graph._pending)
+
+    def test_suggestions_rank_friends_of_friends(self):
+        self.client.force_authenticate(self.users['a'])
+        response = self.client.get(reverse('follow-suggestions'), {'limit': 3})
+
+        # d is followed by both b and c; e only by c; f tops up as popular.
+        self.assertEqual(
+            [(u['username'], u['mutual_count']) for u in response.data],
+            [('d', 2), ('e', 1), ('f', 0)]
+        )
+
+
+class FollowListTests(APITestCase):
+    def setUp(self):
+        self.star = User.objects.create_user(username='star', password='pass')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass') for i in range(5)]
+        for fan in self.fans:
+            fan.following.add(self.star)
+        self.client.force_authenticate(self.star)
+
+    def test_followers_are_keyset_paginated_newest_first(self):
+        url = reverse('user-followers', args=[self.star.pk])
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEqual([u['username'] for u in response.data['results']], ['fan4', 'fan3', 'fan2'])
+        self.assertEqual(set(response.data['results'][0]), {'id', 'username'})
+
+        # existence check, then one joined page query
+        with self.assertNumQueries(2):
+            response = self.client.get(response.data['next'])
+        self.assertEqual([u['username'] for u in response.data['results']], ['fan1', 'fan0'])
+        self.assertIsNone(response.data['next'])
+
+    def test_following(self):
+        response = self.client.get(reverse('user-following', args=[self.fans[0].pk]))
+        self.assertEqual(response.data['results'], [{'id': self.star.pk, 'username': 'star'}])
+        self.assertEqual(self.client.get(reverse('user-following', args=[999])).status_code, 404)
+
+
+class BulkFollowTests(APITestCase):
+    def setUp(self):
+        self.me = User.objects.create_user(username='me', password='pass')
+        self.others = [User.objects.create_user(username=f'user{i}', password='pass') for i in range(4)]
+        self.client.force_authenticate(self.me)
+        self.client.post(reverse('follow-user', args=[self.others[0].pk]))
+
+    def test_bulk_follow_reports_status_per_input(self):
+        Post.objects.create(author=self.others[1], title='Hi', content='Hello')
+
+        response = self.client.post(reverse('bulk-follow'), {
+            'user_ids': [self.others[0].pk, self.others[1].pk, self.me.pk, 999],
+            'usernames': ['user2', 'nobody'],
+        }, format='json')
+        self.assertEqual(response.data['followed'], 2)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']],
+            ['already_following', 'followed', 'self', 'not_found', 'followed', 'not_found']
+        )
+        self.me.refresh_from_db()
+        self.others[1].refresh_from_db()
+        self.assertEqual(self.me.following_count, 3)
+        self.assertEqual(self.others[1].follower_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.me, author=self.others[1]).exists())
+
+    def test_bulk_unfollow(self):
+        response = self.client.post(reverse('bulk-unfollow'), {
+            'user_ids': [self.others[0].pk, self.others[3].pk],
+        }, format='json')
+        self.assertEqual(response.data['unfollowed'], 1)
+        self.assertEqual([r['status'] for r in response.data['results']], ['unfollowed', 'not_following'])
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.following_count, 0)
+        self.assertFalse(self.me.following.exists())
+
+    def test_query_count_does_not_grow_with_batch(self):
+        more = [User.objects.create_user(username=f'more{i}', password='pass') for i in range(20)]
+        # resolve, savepoint, lock, existing, insert, re-read, 2 counters, timeline backfill, release
+        with self.assertNumQueries(10):
+            self.client.post(reverse('bulk-follow'), {'user_ids': [u.pk for u in more]}, format='json')
+
+    def test_follow_changes_lock_the_follower(self):
+        with mock.patch('accounts.views._lock_follows', wraps=views._lock_follows) as lock:
+            self.client.post(reverse('follow-user', args=[self.others[1].pk]))
+            self.client.post(reverse('unfollow-user', args=[self.others[1].pk]))
+            self.client.post(reverse('bulk-follow'), {'user_ids': [self.others[2].pk]}, format='json')
+            self.client.post(reverse('bulk-unfollow'), {'user_ids': [self.others[2].pk]}, format='json')
+        self.assertEqual([call.args[0].pk for call in lock.call_args_list], [self.me.pk] * 4)
+
+    def test_rows_added_by_other_writers_do_not_fail_the_request(self):
+        target = self.others[1]
+        insert = Follow.objects.bulk_create
+
+        def add_first(objs, **kwargs):
+            # e.g. the admin's M2M widget, which neither locks nor counts
+            self.me.following.add(target)
+            return insert(objs, **kwargs)
+
+        with mock.patch.object(Follow.objects, 'bulk_create', side_effect=add_first) as create:
+            response = self.client.post(reverse('bulk-follow'), {'user_ids': [target.pk]}, format='json')
+        create.assert_called_once()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['followed'], 1)
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.following_count, self.me.following.count())
+
+    def test_limits(self):
+        self.assertEqual(self.client.post(reverse('bulk-follow'), {}, format='json').status_code, 400)
+        with self.settings(FOLLOW_BULK_MAX=2):
+            response = self.client.post(reverse('bulk-follow'), {'user_ids': [1, 2, 3]}, format='json')
+        self.assertEqual(response.status_code, 400)
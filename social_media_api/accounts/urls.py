@@ -1,10 +1,16 @@
 from django.urls import path
+from . import async_views
 from .views import (
     RegisterView,
     LoginView,
     ProfileView,
     follow_user,
     unfollow_user,
+    bulk_follow,
+    bulk_unfollow,
+    suggestions,
+    followers,
+    following,
 )
 
 urlpatterns = [
@@ -15,4 +21,12 @@ urlpatterns = [
     # ✅ Follow management
     path('follow/<int:user_id>/', follow_user, name='follow-user'),
     path('unfollow/<int:user_id>/', unfollow_user, name='unfollow-user'),
+    path('follow/bulk/', bulk_follow, name='bulk-follow'),
+    path('unfollow/bulk/', bulk_unfollow, name='bulk-unfollow'),
+    path('suggestions/', suggestions, name='follow-suggestions'),
+    path('<int:user_id>/followers/', followers, name='user-followers'),
+    path('<int:user_id>/following/', following, name='user-following'),
+
+    # ✅ Async (ASGI) reads
+    path('async/profile/', async_views.profile, name='async-profile'),
 ]
@@ -4,11 +4,18 @@ from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
-from .serializers import RegisterSerializer, UserSerializer
+from .serializers import BulkFollowSerializer, RegisterSerializer, SuggestionSerializer, UserSerializer
+from .graph import follow_graph
+from .pagination import FollowPagination
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from functools import partial
+from posts import timeline
 
 User = get_user_model()
 CustomUser = get_user_model()
+Follow = CustomUser.following.through
 
 # User registration
 class RegisterView(generics.CreateAPIView):
@@ -43,16 +50,41 @@ class ProfileView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        # request.user may come from the token cache; read fresh counters.
+        return User.objects.get(pk=self.request.user.pk)
+
+def _lock_follows(user):
+    """
+    Lock ``user``'s row until the transaction ends.
+
+    Only ``user`` adds or removes their own follows, so while the lock is
+    held, a read of their existing follows stays true and the counters can
+    be moved by exactly the rows written.
+    """
+    list(CustomUser.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def follow_user(request, user_id):
-    users = CustomUser.objects.all()
-
     try:
         user_to_follow = CustomUser.objects.get(id=user_id)
-        request.user.following.add(user_to_follow)
+        with transaction.atomic():
+            _lock_follows(request.user)
+            _, created = Follow.objects.get_or_create(
+                from_user=request.user,
+                to_user=user_to_follow
+            )
+            if created:
+                CustomUser.objects.filter(pk=request.user.pk).update(
+                    following_count=F('following_count') + 1
+                )
+                CustomUser.objects.filter(pk=user_to_follow.pk).update(
+                    follower_count=F('follower_count') + 1
+                )
+                transaction.on_commit(partial(follow_graph.followed, request.user.pk, user_to_follow.pk))
+        if created:
+            timeline.backfill(request.user, user_to_follow)
         return Response({'message': 'User followed successfully'})
     except CustomUser.DoesNotExist:
         return Response({'error': 'User not found'}, status=404)
@@ -61,11 +93,181 @@ def follow_user(request, user_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def unfollow_user(request, user_id):
-    users = CustomUser.objects.all()
-
     try:
         user_to_unfollow = CustomUser.objects.get(id=user_id)
-        request.user.following.remove(user_to_unfollow)
+        with transaction.atomic():
+            _lock_follows(request.user)
+            deleted, _ = Follow.objects.filter(
+                from_user=request.user,
+                to_user=user_to_unfollow
+            ).delete()
+            if deleted:
+                CustomUser.objects.filter(pk=request.user.pk).update(
+                    following_count=F('following_count') - 1
+                )
+                CustomUser.objects.filter(pk=user_to_unfollow.pk).update(
+                    follower_count=F('follower_count') - 1
+                )
+                transaction.on_commit(partial(follow_graph.unfollowed, request.user.pk, user_to_unfollow.pk))
+                if timeline.is_high_fanout(user_to_unfollow):
+                    # They may have just dropped under the limit.
+                    transaction.on_commit(partial(timeline.refill, user_to_unfollow.pk))
+        timeline.prune(request.user, user_to_unfollow)
         return Response({'message': 'User unfollowed successfully'})
     except CustomUser.DoesNotExist:
-        return Response({'error': 'User not found'}, status=404)
\ No newline at end of file
+        return Response({'error': 'User not found'}, status=404)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def suggestions(request):
+    """Who to follow: friends of friends, ranked in memory by accounts.graph."""
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+    ranked = follow_graph.suggestions(request.user.pk, max(1, limit))
+
+    users = User.objects.filter(is_active=True).in_bulk([user_id for user_id, _ in ranked])
+    serializer = SuggestionSerializer(
+        [users[user_id] for user_id, _ in ranked if user_id in users],
+        many=True,
+        context={'mutual_counts': dict(ranked)}
+    )
+    return Response(serializer.data)
+
+
+
+def _resolve_targets(request):
+    """
+    Validate a bulk follow/unfollow body and resolve it in one query.
+
+    Returns the per-input results (status still unset for resolved users)
+    and the resolved users by id, excluding the requesting user.
+    """
+    serializer = BulkFollowSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    user_ids = serializer.validated_data['user_ids']
+    usernames = serializer.validated_data['usernames']
+
+    users = CustomUser.objects.filter(Q(id__in=user_ids) | Q(username__in=usernames)).only(
+        'id', 'username', 'follower_count'
+    )
+    by_id = {user.id: user for user in users}
+    by_username = {user.username: user for user in by_id.values()}
+
+    results = []
+    for key, lookup in [(i, by_id) for i in user_ids] + [(name, by_username) for name in usernames]:
+        user = lookup.get(key)
+        result = {'user': key, 'id': user.id if user else None, 'status': None}
+        if user is None:
+            result['status'] = 'not_found'
+        elif user.id == request.user.id:
+            result['status'] = 'self'
+        results.append(result)
+    by_id.pop(request.user.id, None)
+    return results, by_id
+
+
+def _finish_results(results, statuses):
+    for result in results:
+        if result['status'] is None:
+            result['status'] = statuses[result['id']]
+    return results
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_follow(request):
+    """
+    Follow up to FOLLOW_BULK_MAX users given by ``user_ids`` and/or
+    ``usernames``, e.g. from an address book import. Targets are resolved in
+    one query, missing follows inserted in one statement and timelines
+    backfilled in one more; the response has a status per input.
+    """
+    results, targets = _resolve_targets(request)
+    me = request.user
+
+    with transaction.atomic():
+        _lock_follows(me)
+        existing = set(
+            Follow.objects.filter(from_user=me, to_user_id__in=targets)
+            .values_list('to_user_id', flat=True)
+        )
+        new_ids = [user_id for user_id in targets if user_id not in existing]
+        Follow.objects.bulk_create(
+            [Follow(from_user_id=me.id, to_user_id=user_id) for user_id in new_ids],
+            ignore_conflicts=True
+        )
+        if new_ids:
+            # Writers that skip the lock (admin, seeding) may have added some
+            # of these meanwhile without touching the counters; move them by
+            # the rows that exist now and did not before.
+            now_following = set(
+                Follow.objects.filter(from_user=me, to_user_id__in=new_ids)
+                .values_list('to_user_id', flat=True)
+            )
+            new_ids = [user_id for user_id in new_ids if user_id in now_following]
+        if new_ids:
+            CustomUser.objects.filter(pk=me.pk).update(following_count=F('following_count') + len(new_ids))
+            CustomUser.objects.filter(pk__in=new_ids).update(follower_count=F('follower_count') + 1)
+            for user_id in new_ids:
+                transaction.on_commit(partial(follow_graph.followed, me.pk, user_id))
+
+    timeline.backfill_many(me, [targets[user_id] for user_id in new_ids])
+
+    statuses = dict.fromkeys(existing, 'already_following')
+    statuses.update(dict.fromkeys(new_ids, 'followed'))
+    return Response({'followed': len(new_ids), 'results': _finish_results(results, statuses)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_unfollow(request):
+    """Batch counterpart of ``unfollow_user``; same body as ``bulk_follow``."""
+    results, targets = _resolve_targets(request)
+    me = request.user
+
+    with transaction.atomic():
+        _lock_follows(me)
+        removed = list(
+            Follow.objects.filter(from_user=me, to_user_id__in=targets)
+            .values_list('to_user_id', flat=True)
+        )
+        if removed:
+            Follow.objects.filter(from_user=me, to_user_id__in=removed).delete()
+            CustomUser.objects.filter(pk=me.pk).update(following_count=F('following_count') - len(removed))
+            CustomUser.objects.filter(pk__in=removed).update(follower_count=F('follower_count') - 1)
+            for user_id in removed:
+                transaction.on_commit(partial(follow_graph.unfollowed, me.pk, user_id))
+                if timeline.is_high_fanout(targets[user_id]):
+                    transaction.on_commit(partial(timeline.refill, user_id))
+
+    timeline.prune_many(me, removed)
+
+    statuses = dict.fromkeys(targets, 'not_following')
+    statuses.update(dict.fromkeys(removed, 'unfollowed'))
+    return Response({'unfollowed': len(removed), 'results': _finish_results(results, statuses)})
+
+
+def _follow_list(request, user_id, side, other):
+    """Keyset page of the users on the ``other`` side of ``side=user_id`` follows."""
+    generics.get_object_or_404(User.objects.only('id'), pk=user_id)
+    rows = Follow.objects.filter(**{f'{side}_id': user_id}).values('id', f'{other}_id', f'{other}__username')
+
+    paginator = FollowPagination()
+    page = paginator.paginate_queryset(rows, request)
+    data = [{'id': row[f'{other}_id'], 'username': row[f'{other}__username']} for row in page]
+    return paginator.get_paginated_response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def followers(request, user_id):
+    return _follow_list(request, user_id, 'to_user', 'from_user')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def following(request, user_id):
+    return _follow_list(request, user_id, 'from_user', 'to_user')
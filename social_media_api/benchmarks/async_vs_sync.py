@@ -0,0 +1,93 @@
+"""
+Compare the sync and async feed endpoints under concurrent load.
+
+    python benchmarks/async_vs_sync.py --requests 400 --concurrency 32
+
+Both variants run in-process against a test database. ``--db-latency``
+adds an artificial delay to every query. Note that Django's async ORM
+still runs queries on a single sync thread, so the async view's advantage
+is in how many slow connections one worker can hold open, not in raw
+query throughput.
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import Timer, seed_feed, summarize, test_database
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+
+
+def add_query_latency(delay):
+    # Every thread has its own connection, so hook each one as it opens.
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False)
+    connection.execute_wrappers.append(wrapper)
+
+
+def run_sync(url, token, requests, concurrency):
+    client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def one(_):
+        start = time.perf_counter()
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - start
+
+    with Timer() as timer, ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    return summarize(latencies, timer.elapsed)
+
+
+async def run_async(url, token, requests, concurrency):
+    client = AsyncClient()
+    headers = {'Authorization': f'Token {token}'}
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            start = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - start
+
+    with Timer() as timer:
+        latencies = await asyncio.gather(*(one() for _ in range(requests)))
+    return summarize(latencies, timer.elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--db-latency', type=float, default=0.0, help='seconds added per query')
+    args = parser.parse_args()
+
+    with test_database():
+        token = seed_feed()
+        if args.db_latency:
+            add_query_latency(args.db_latency)
+        results = {
+            'sync': run_sync('/api/feed/', token, args.requests, args.concurrency),
+            'async': asyncio.run(run_async('/api/async/feed/', token, args.requests, args.concurrency)),
+        }
+
+    for name, result in results.items():
+        print(
+            f"{name:>5}: {result['throughput']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+            f"p99 {result['p99_ms']:7.2f} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Shared setup for the scripts in this directory.
+
+Importing this module configures Django with the project settings. Use
+``test_database()`` to run against a throwaway test database so the real
+db.sqlite3 is never touched.
+"""
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_media_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+
+
+@contextmanager
+def test_database():
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def seed_feed(users=20, posts_per_user=20):
+    """A reader following ``users`` authors. Returns the reader's token key."""
+    from django.contrib.auth import get_user_model
+    from rest_framework.authtoken.models import Token
+
+    from posts import timeline
+    from posts.models import Post
+
+    User = get_user_model()
+    reader = User.objects.create_user(username='reader', password='pass')
+    for i in range(users):
+        author = User.objects.create_user(username=f'author{i}', password='pass')
+        reader.following.add(author)
+        for j in range(posts_per_user):
+            post = Post.objects.create(author=author, title=f'Post {j}', content='Lorem ipsum ' * 20)
+            timeline.fan_out_post(post)
+    return Token.objects.create(user=reader).key
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
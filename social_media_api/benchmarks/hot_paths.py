@@ -0,0 +1,224 @@
+"""
+Latency, throughput and query counts for the API's hot paths.
+
+    python benchmarks/hot_paths.py --users 500 --requests 200 --output after.json
+    python benchmarks/hot_paths.py --compare before.json after.json
+
+A test database is filled with ``manage.py seed_social`` (same seed, same
+data), then each scenario is driven sequentially through the Django test
+client with token authentication, so every request goes through the full
+middleware stack. Results are written as JSON. ``--compare BASELINE``
+checks a run against a baseline. The exit status is 1 when any scenario's
+p95 latency grows by more than ``--tolerance`` or when it issues more
+queries than before.
+
+Each write scenario likes or follows something new on every request, so it
+is cut down to the posts and users the seeded data has; the number of
+requests actually measured is in each result.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from harness import BASE_DIR, Timer, summarize, test_database
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from posts.models import Post
+from social_media_api.metrics import QueryTracker
+
+User = get_user_model()
+
+
+def client_for(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    return Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+class Fixture:
+    """Clients and ids the scenarios draw from, picked deterministically."""
+
+    WRITES = {'like_post': 'post_ids', 'follow_user': 'user_ids'}
+
+    def __init__(self, seed, requests, writers=10):
+        rng = random.Random(seed)
+        readers = User.objects.order_by('-following_count', 'id')[:writers]
+        popular = User.objects.order_by('-follower_count', 'id')[:writers]
+        self.readers = [client_for(user) for user in readers]
+        self.recipients = [client_for(user) for user in popular]
+
+        # Fresh accounts, so every like and follow in the run is a new one.
+        self.writers = [
+            client_for(User.objects.create_user(username=f'bench{i}', password='!'))
+            for i in range(writers)
+        ]
+        per_writer = -(-requests // writers)
+        post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
+        user_ids = list(User.objects.exclude(username__startswith='bench').order_by('id').values_list('id', flat=True))
+        self.post_ids = rng.sample(post_ids, min(len(post_ids), per_writer))
+        self.user_ids = rng.sample(user_ids, min(len(user_ids), per_writer))
+
+    def clamp(self, name, requests, warmup):
+        """Cut a write scenario down to the targets there are to act on."""
+        if name not in self.WRITES:
+            return requests, warmup
+        available = len(getattr(self, self.WRITES[name])) * len(self.writers)
+        requests = min(requests, available)
+        return requests, min(warmup, available - requests)
+
+    def writer(self, i):
+        return self.writers[i % len(self.writers)]
+
+    def scenarios(self):
+        pick = lambda clients, i: clients[i % len(clients)]  # noqa: E731
+        return {
+            'feed': lambda i: pick(self.readers, i).get('/api/feed/'),
+            'post_list': lambda i: pick(self.readers, i).get('/api/posts/'),
+            'search': lambda i: pick(self.readers, i).get('/api/posts/', {'search': 'tempor'}),
+            'like_post': lambda i: self.writer(i).post(
+                f'/api/posts/{self.post_ids[i // len(self.writers)]}/like/'
+            ),
+            'follow_user': lambda i: self.writer(i).post(
+                f'/api/accounts/follow/{self.user_ids[i // len(self.writers)]}/'
+            ),
+            'notifications': lambda i: pick(self.recipients, i).get('/api/notifications/'),
+        }
+
+
+def measure(request, requests, warmup):
+    # Warm-up requests use indexes past the measured ones, so writes stay unique.
+    for i in range(requests, requests + warmup):
+        request(i)
+
+    latencies, queries = [], []
+    with Timer() as timer:
+        for i in range(requests):
+            tracker = QueryTracker()
+            start = time.perf_counter()
+            with connection.execute_wrapper(tracker):
+                response = request(i)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code < 400, (response.status_code, response.content[:200])
+            queries.append(tracker.count)
+
+    result = summarize(latencies, timer.elapsed)
+    result['queries_mean'] = sum(queries) / len(queries)
+    result['queries_max'] = max(queries)
+    return result
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    with test_database():
+        call_command('seed_social', users=args.users, seed=args.seed, stdout=sys.stderr)
+        fixture = Fixture(args.seed, args.requests + args.warmup)
+        scenarios = fixture.scenarios()
+        selected = args.only or list(scenarios)
+        results = {}
+        for name in selected:
+            requests, warmup = fixture.clamp(name, args.requests, args.warmup)
+            if not requests:
+                print(f'{name:<14} skipped, nothing to act on', file=sys.stderr)
+                continue
+            if requests < args.requests:
+                print(f'{name:<14} limited to {requests} requests by the seeded data', file=sys.stderr)
+            results[name] = measure(scenarios[name], requests, warmup)
+            print(f'{name:<14} done', file=sys.stderr)
+        vendor = connection.vendor
+
+    return {
+        'meta': {
+            'revision': revision(),
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': vendor,
+            'users': args.users,
+            'seed': args.seed,
+            'requests': args.requests,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, tolerance):
+    """Print a table of both runs; return the names of regressed scenarios."""
+    regressions = []
+    print(f"{'scenario':<14} {'p95 before':>11} {'p95 after':>10} {'change':>8} {'queries':>9}")
+    for name, after in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f'{name:<14} (new)')
+            continue
+        change = after['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0.0
+        queries = f"{before['queries_max']}->{after['queries_max']}"
+        regressed = change > tolerance or after['queries_max'] > before['queries_max']
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<14} {before['p95_ms']:9.2f}ms {after['p95_ms']:8.2f}ms {change:+8.0%} "
+            f"{queries:>9}{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--only', nargs='+', help='run only these scenarios')
+    parser.add_argument('--output', help='write the results JSON here')
+    parser.add_argument(
+        '--compare',
+        nargs='+',
+        metavar='JSON',
+        help='baseline results, optionally followed by results to compare instead of running',
+    )
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative p95 increase')
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 1:
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+    else:
+        current = run(args)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+    elif not args.compare:
+        json.dump(current, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.tolerance)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
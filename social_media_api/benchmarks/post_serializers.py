@@ -0,0 +1,60 @@
+"""
+PostSerializer versus the flat values() fast path for list pages.
+
+    python benchmarks/post_serializers.py --posts 2000 --repeat 10
+
+Each variant loads and serializes the same posts from a test database;
+the naive variant omits select_related to show the N+1 cost as well.
+"""
+import argparse
+
+from harness import Timer, test_database
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Post
+from posts.serializers import FlatPostSerializer, PostSerializer
+
+
+def seed(count):
+    User = get_user_model()
+    authors = User.objects.bulk_create(
+        User(username=f'author{i}', password='!') for i in range(50)
+    )
+    Post.objects.bulk_create(
+        Post(author=authors[i % len(authors)], title=f'Post {i}', content='Lorem ipsum ' * 20)
+        for i in range(count)
+    )
+
+
+VARIANTS = {
+    'PostSerializer (no select_related)': lambda: PostSerializer(Post.objects.all(), many=True).data,
+    'PostSerializer (select_related)': lambda: PostSerializer(
+        Post.objects.select_related('author'), many=True
+    ).data,
+    'FlatPostSerializer': lambda: FlatPostSerializer(FlatPostSerializer.project(Post.objects.all())).data,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with test_database():
+        seed(args.posts)
+        for name, run in VARIANTS.items():
+            with CaptureQueriesContext(connection) as queries:
+                run()
+            with Timer() as timer:
+                for _ in range(args.repeat):
+                    run()
+            rate = args.posts * args.repeat / timer.elapsed
+            print(f'{name:<36} {rate:10.0f} posts/s  {len(queries):5d} queries')
+
+
+if __name__ == '__main__':
+    main()
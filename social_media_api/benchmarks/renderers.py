@@ -0,0 +1,80 @@
+"""
+Throughput of JSON rendering and compression for PostSerializer lists.
+
+    python benchmarks/renderers.py --posts 1000 --repeat 20
+
+Posts are built in memory, so no database is needed. Rates are in MB of
+rendered JSON processed per second.
+"""
+import argparse
+import time
+
+import harness  # noqa: F401  (configures Django)
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from posts.models import Post
+from posts.serializers import PostSerializer
+from social_media_api import compression
+from social_media_api.renderers import FastJSONRenderer, orjson
+
+
+def build_posts(count):
+    author = get_user_model()(id=1, username='author')
+    now = timezone.now()
+    return [
+        Post(
+            id=i,
+            author=author,
+            title=f'Post number {i}',
+            content='Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def rate(func, payload_size, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = time.perf_counter() - start
+    return payload_size * repeat / elapsed / 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    posts = build_posts(args.posts)
+    data = PostSerializer(posts, many=True).data
+    size = len(JSONRenderer().render(data))
+    print(f'{args.posts} posts, {size / 1e3:.1f} kB of JSON')
+
+    renderers = [('drf json', JSONRenderer())]
+    if orjson is not None:
+        renderers.append(('orjson', FastJSONRenderer()))
+    else:
+        print('orjson is not installed; FastJSONRenderer falls back to drf json')
+
+    for name, renderer in renderers:
+        mbps, _ = rate(lambda: renderer.render(data), size, args.repeat)
+        print(f'  render   {name:<10} {mbps:8.1f} MB/s')
+
+    body = FastJSONRenderer().render(data)
+    encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+    for encoding in encodings:
+        def compress():
+            compressor = compression._Compressor(encoding)
+            return compressor.compress(body) + compressor.finish()
+        mbps, compressed = rate(compress, size, args.repeat)
+        print(f'  compress {encoding:<10} {mbps:8.1f} MB/s  ratio {size / len(compressed):5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Concurrent writers on SQLite with default versus tuned connection options.
+
+    python benchmarks/sqlite_tuning.py --threads 8 --ops 150
+
+Each variant gets a fresh database file in a temporary directory, migrated
+and seeded with ``seed_social``. Worker threads then mix likes, comments
+and feed reads through the test client, each on its own connection. The
+"tuned" variant uses the OPTIONS from settings.DATABASES (mmap, cache size,
+busy timeout and BEGIN IMMEDIATE) and always adds WAL with
+synchronous=NORMAL, which the settings only enable with SQLITE_WAL=1;
+"default" uses none. Requests that fail with "database is locked" are
+counted as errors; throughput and latency cover successful requests only.
+"""
+import argparse
+import copy
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+
+from harness import Timer, summarize
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+
+from posts.models import Post
+
+TUNED_OPTIONS = copy.deepcopy(settings.DATABASES['default'].get('OPTIONS', {}))
+if not settings.SQLITE_WAL:
+    # The files here are throwaway, so WAL is safe to switch on.
+    TUNED_OPTIONS['init_command'] = 'PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL;' + TUNED_OPTIONS['init_command']
+
+
+def use_database(path, options):
+    connections.close_all()
+    db = connections.settings['default']
+    db['NAME'] = str(path)
+    db['OPTIONS'] = copy.deepcopy(options)
+
+
+def prepare(threads, users):
+    call_command('migrate', verbosity=0)
+    call_command('seed_social', users=users, skip_derived=True, stdout=StringIO())
+    User = get_user_model()
+    tokens = []
+    for i in range(threads):
+        user = User.objects.create_user(username=f'writer{i}', password='!')
+        tokens.append(Token.objects.create(user=user).key)
+    post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
+    connections.close_all()
+    return tokens, post_ids
+
+
+def worker(token, post_ids, ops, offset, latencies, errors):
+    client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+    try:
+        for i in range(ops):
+            post_id = post_ids[(offset + i) % len(post_ids)]
+            start = time.perf_counter()
+            try:
+                if i % 3 == 0:
+                    response = client.post(f'/api/posts/{post_id}/like/')
+                elif i % 3 == 1:
+                    response = client.post(f'/api/posts/{post_id}/comments/', {'content': 'Nice'})
+                else:
+                    response = client.get('/api/feed/')
+            except OperationalError:
+                errors.append(i)
+                continue
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code < 400, response.status_code
+    finally:
+        connections.close_all()
+
+
+def run(name, options, args, directory):
+    use_database(Path(directory) / f'{name}.sqlite3', options)
+    tokens, post_ids = prepare(args.threads, args.users)
+
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=worker, args=(token, post_ids, args.ops, i * args.ops, latencies, errors))
+        for i, token in enumerate(tokens)
+    ]
+    with Timer() as timer:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    result = summarize(latencies, timer.elapsed)
+    result['errors'] = len(errors)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=150, help='requests per thread')
+    parser.add_argument('--users', type=int, default=200, help='users passed to seed_social')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            results = {
+                'default': run('default', {}, args, directory),
+                'tuned': run('tuned', TUNED_OPTIONS, args, directory),
+            }
+            connections.close_all()
+    finally:
+        teardown_test_environment()
+
+    for name, result in results.items():
+        print(
+            f"{name:>7}: {result['throughput']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+            f"p99 {result['p99_ms']:7.2f} ms  locked errors {result['errors']}"
+        )
+
+
+if __name__ == '__main__':
+    main()
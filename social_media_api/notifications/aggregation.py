@@ -0,0 +1,152 @@
+"""
+Write-time coalescing of notifications.
+
+Events that share recipient, verb and target and arrive within
+``NOTIFICATIONS_AGGREGATE_WINDOW`` seconds of the last one are folded into
+a single unread Notification ("alice and 41 others liked your post"), so a
+viral post adds one row per recipient instead of one per like.
+
+``actor_count`` counts distinct actors. Each aggregate's actors are kept in
+``NotificationActor``, so someone who likes, unlikes and likes again is
+counted once.
+"""
+import datetime
+from collections import Counter
+from functools import partial, reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import unread
+from .models import Notification, NotificationActor
+
+User = get_user_model()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _key(event):
+    return (
+        event.recipient_id,
+        event.verb,
+        event.target_content_type_id,
+        event.target_object_id,
+    )
+
+
+def _merge_samples(samples, actor_ids, usernames):
+    size = _setting('NOTIFICATIONS_SAMPLE_ACTORS', 3)
+    seen = {sample['id'] for sample in samples}
+    merged = list(samples)
+    for actor_id in actor_ids:
+        if len(merged) >= size:
+            break
+        if actor_id not in seen:
+            merged.append({'id': actor_id, 'username': usernames.get(actor_id, '')})
+            seen.add(actor_id)
+    return merged
+
+
+def _open_aggregates(keys, since):
+    """Unread notifications in the window matching any of ``keys``, one query."""
+    condition = reduce(or_, (
+        Q(
+            recipient_id=recipient_id,
+            verb=verb,
+            target_content_type_id=content_type_id,
+            target_object_id=object_id,
+        )
+        for recipient_id, verb, content_type_id, object_id in keys
+    ))
+    latest = {}
+    candidates = (
+        Notification.objects.filter(condition, is_read=False, timestamp__gte=since)
+        .order_by('timestamp', 'id')
+    )
+    for notification in candidates:
+        latest[_key(notification)] = notification
+    return latest
+
+
+def _known_actors(notifications, actor_ids):
+    """(notification_id, actor_id) pairs already recorded, one query."""
+    return set(
+        NotificationActor.objects.filter(
+            notification_id__in=[notification.pk for notification in notifications],
+            actor_id__in=actor_ids,
+        ).values_list('notification_id', 'actor_id')
+    )
+
+
+def fold(events):
+    """
+    Write ``events`` (objects with recipient_id, actor_id, verb and target
+    ids) as notifications, merging into open aggregates where possible.
+
+    Returns the newly created Notification rows.
+    """
+    if not events:
+        return []
+
+    groups = {}
+    for event in events:
+        ids = groups.setdefault(_key(event), [])
+        # Keep each actor once, at its latest position.
+        if event.actor_id in ids:
+            ids.remove(event.actor_id)
+        ids.append(event.actor_id)
+
+    now = timezone.now()
+    window = datetime.timedelta(seconds=_setting('NOTIFICATIONS_AGGREGATE_WINDOW', 3600))
+    existing = _open_aggregates(groups.keys(), now - window)
+
+    actor_ids = {actor_id for ids in groups.values() for actor_id in ids}
+    usernames = dict(User.objects.filter(id__in=actor_ids).values_list('id', 'username'))
+
+    known = _known_actors(existing.values(), actor_ids) if existing else set()
+
+    created, updated, actors = [], [], []
+    for key, ids in groups.items():
+        recipient_id, verb, content_type_id, object_id = key
+        notification = existing.get(key)
+        if notification is None:
+            notification = Notification(
+                recipient_id=recipient_id,
+                actor_id=ids[-1],
+                verb=verb,
+                target_content_type_id=content_type_id,
+                target_object_id=object_id,
+                actor_count=len(ids),
+                sample_actors=_merge_samples([], ids, usernames),
+            )
+            created.append(notification)
+            new_ids = ids
+        else:
+            new_ids = [actor_id for actor_id in ids if (notification.pk, actor_id) not in known]
+            notification.actor_id = ids[-1]
+            notification.actor_count = F('actor_count') + len(new_ids)
+            notification.sample_actors = _merge_samples(notification.sample_actors, ids, usernames)
+            notification.timestamp = now
+            updated.append(notification)
+        actors.extend((notification, actor_id) for actor_id in new_ids)
+
+    Notification.objects.bulk_create(created)
+    NotificationActor.objects.bulk_create(
+        [NotificationActor(notification_id=notification.pk, actor_id=actor_id) for notification, actor_id in actors],
+        ignore_conflicts=True
+    )
+    # Folding into an already-unread row leaves the unread count unchanged.
+    for recipient_id, amount in Counter(n.recipient_id for n in created).items():
+        transaction.on_commit(partial(unread.added, recipient_id, amount))
+    if updated:
+        Notification.objects.bulk_update(
+            updated,
+            ['actor', 'actor_count', 'sample_actors', 'timestamp']
+        )
+    return created
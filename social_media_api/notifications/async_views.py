@@ -0,0 +1,23 @@
+from social_media_api.async_api import async_api_view, json_response, render_page
+
+from . import targets, unread
+from .models import Notification
+from .pagination import NotificationPagination
+from .serializers import NotificationSerializer
+
+
+@async_api_view
+async def user_notifications(request):
+    notifications = targets.with_targets(
+        Notification.objects.filter(recipient=request.user)
+    )
+
+    paginator = NotificationPagination()
+    page = await paginator.apaginate_queryset(notifications, request)
+    return await render_page(paginator, NotificationSerializer, page, request)
+
+
+@async_api_view
+async def unread_count(request):
+    count = await unread.acount(request.user.id)
+    return json_response({'unread_count': count})
@@ -0,0 +1,88 @@
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from notifications import outbox
+
+
+class Command(BaseCommand):
+    help = 'Drain the notification outbox into Notification rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'NOTIFICATIONS_BATCH_SIZE', 500),
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of worker threads claiming batches in parallel.',
+        )
+        parser.add_argument(
+            '--idle-sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the outbox is empty.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit as soon as the outbox is empty.',
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.delivered = 0
+        self.lock = threading.Lock()
+
+        if options['concurrency'] <= 1:
+            try:
+                self.work(options)
+            except KeyboardInterrupt:
+                pass
+        else:
+            self.run_threads(options)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {self.delivered} notification jobs.'))
+
+    def run_threads(self, options):
+        threads = [
+            threading.Thread(target=self.work_in_thread, args=(options,), daemon=True)
+            for _ in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work_in_thread(self, options):
+        # Each thread gets its own connection; drop it when done.
+        try:
+            self.work(options, recycle_connections=True)
+        finally:
+            connection.close()
+
+    def work(self, options, recycle_connections=False):
+        worker_id = uuid.uuid4().hex
+        while not self.stop.is_set():
+            if recycle_connections:
+                close_old_connections()
+            handled = outbox.process_batch(options['batch_size'], worker_id)
+            with self.lock:
+                self.delivered += handled
+            if handled:
+                continue
+            if options['once']:
+                return
+            self.stop.wait(options['idle_sleep'])
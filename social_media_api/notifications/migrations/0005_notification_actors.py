@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_known_actors(apps, schema_editor):
+    # Only the latest and sampled actors of existing aggregates are known.
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationActor = apps.get_model('notifications', 'NotificationActor')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    def flush(pairs):
+        # Sampled actors may have been deleted since.
+        live = set(User.objects.filter(id__in={actor_id for _, actor_id in pairs}).values_list('id', flat=True))
+        NotificationActor.objects.bulk_create(
+            [NotificationActor(notification_id=pk, actor_id=actor_id) for pk, actor_id in pairs if actor_id in live],
+            ignore_conflicts=True
+        )
+
+    pairs = []
+    for pk, actor_id, samples in Notification.objects.values_list('pk', 'actor_id', 'sample_actors').iterator():
+        ids = {actor_id} | {sample['id'] for sample in samples or ()}
+        pairs.extend((pk, i) for i in ids)
+        if len(pairs) >= 1000:
+            flush(pairs)
+            pairs = []
+    flush(pairs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actors', to='notifications.notification')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('notification', 'actor'), name='notif_actor_unique')],
+            },
+        ),
+        migrations.RunPython(record_known_actors, migrations.RunPython.noop),
+    ]
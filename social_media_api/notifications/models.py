@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
@@ -34,5 +35,81 @@ class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    # Aggregation: similar events within NOTIFICATIONS_AGGREGATE_WINDOW are
+    # folded into one row. `actor` is the latest actor, `actor_count` the
+    # number of distinct actors (see NotificationActor) and `sample_actors`
+    # the first few {id, username}.
+    actor_count = models.PositiveIntegerField(default=1)
+    sample_actors = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['recipient', 'target_content_type', 'target_object_id', 'verb'],
+                name='notif_aggregate_idx'
+            ),
+            models.Index(fields=['recipient', 'is_read', '-timestamp'], name='notif_unread_idx'),
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notif_recipient_recent_idx'),
+        ]
+
     def __str__(self):
         return f'{self.actor} {self.verb}'
+
+
+class NotificationActor(models.Model):
+    # Distinct actors folded into an aggregated Notification, so repeat
+    # events from the same user do not inflate actor_count.
+    notification = models.ForeignKey(
+        Notification,
+        related_name='actors',
+        on_delete=models.CASCADE
+    )
+    actor = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'actor'], name='notif_actor_unique'),
+        ]
+
+
+class NotificationJob(models.Model):
+    # Outbox row: written in the request's transaction and turned into a
+    # Notification by `manage.py process_notifications`.
+    recipient = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    actor = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['failed', 'available_at', 'id'], name='notif_job_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f'Job: {self.actor_id} {self.verb} -> {self.recipient_id}'
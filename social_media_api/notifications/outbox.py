@@ -0,0 +1,107 @@
+"""
+Transactional outbox for notifications.
+
+Views call ``enqueue`` inside their own transaction, which costs one small
+insert. ``manage.py process_notifications`` then claims jobs in batches,
+folds them into Notification rows (see ``aggregation``) and deletes the
+jobs.
+"""
+import datetime
+import uuid
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import aggregation
+from .models import NotificationJob
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(recipient_id, actor_id, verb, target=None):
+    job = NotificationJob(recipient_id=recipient_id, actor_id=actor_id, verb=verb)
+    if target is not None:
+        # get_for_model() is served from ContentType's in-process cache.
+        job.target_content_type = ContentType.objects.get_for_model(target)
+        job.target_object_id = target.pk
+    job.save()
+    return job
+
+
+def _ready(now):
+    lease = datetime.timedelta(seconds=_setting('NOTIFICATIONS_LEASE_SECONDS', 300))
+    return NotificationJob.objects.filter(
+        failed=False,
+        available_at__lte=now,
+    ).filter(
+        Q(claimed_by='') | Q(claimed_at__lt=now - lease)
+    )
+
+
+def claim(batch_size, worker_id=None):
+    """
+    Lease up to ``batch_size`` ready jobs to this worker.
+
+    The conditional UPDATE means two workers racing for the same rows can
+    never both win them, without needing SELECT ... FOR UPDATE.
+    """
+    worker_id = worker_id or uuid.uuid4().hex
+    now = timezone.now()
+    ids = list(_ready(now).order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    _ready(now).filter(id__in=ids).update(claimed_by=worker_id, claimed_at=now)
+    return list(NotificationJob.objects.filter(id__in=ids, claimed_by=worker_id).order_by('id'))
+
+
+def deliver(jobs):
+    with transaction.atomic():
+        notifications = aggregation.fold(jobs)
+        NotificationJob.objects.filter(id__in=[job.id for job in jobs]).delete()
+    return notifications
+
+
+def release(jobs, error):
+    """Put failed jobs back with exponential backoff, or park them."""
+    max_attempts = _setting('NOTIFICATIONS_MAX_ATTEMPTS', 5)
+    retry_delay = _setting('NOTIFICATIONS_RETRY_DELAY', 30)
+    now = timezone.now()
+    for job in jobs:
+        job.attempts += 1
+        job.failed = job.attempts >= max_attempts
+        job.available_at = now + datetime.timedelta(seconds=retry_delay * 2 ** (job.attempts - 1))
+        job.claimed_by = ''
+        job.claimed_at = None
+        job.last_error = str(error)
+    NotificationJob.objects.bulk_update(
+        jobs,
+        ['attempts', 'failed', 'available_at', 'claimed_by', 'claimed_at', 'last_error']
+    )
+
+
+def process_batch(batch_size=None, worker_id=None):
+    """Claim and deliver one batch. Returns the number of jobs handled."""
+    batch_size = batch_size or _setting('NOTIFICATIONS_BATCH_SIZE', 500)
+    jobs = claim(batch_size, worker_id)
+    if not jobs:
+        return 0
+    try:
+        deliver(jobs)
+    except Exception as exc:
+        release(jobs, exc)
+    return len(jobs)
+
+
+def drain(batch_size=None):
+    """Deliver everything that is ready now."""
+    total = 0
+    while True:
+        handled = process_batch(batch_size)
+        if not handled:
+            return total
+        total += handled
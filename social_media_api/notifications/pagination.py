@@ -0,0 +1,5 @@
+from social_media_api.pagination import KeysetPagination
+
+
+class NotificationPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
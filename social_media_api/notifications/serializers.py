@@ -1,9 +1,13 @@
 from rest_framework import serializers
+from . import targets
 from .models import Notification
 
 
 class NotificationSerializer(serializers.ModelSerializer):
     actor = serializers.StringRelatedField()
+    sample_actors = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
+    target = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
@@ -13,4 +17,32 @@ class NotificationSerializer(serializers.ModelSerializer):
             'verb',
             'timestamp',
             'is_read',
-        ]
\ No newline at end of file
+            'actor_count',
+            'sample_actors',
+            'summary',
+            'target',
+        ]
+
+    def get_sample_actors(self, obj):
+        return [sample['username'] for sample in obj.sample_actors]
+
+    def get_target(self, obj):
+        # Expects targets to be prefetched, see targets.with_targets().
+        return targets.summarize(obj.target)
+
+    def get_summary(self, obj):
+        samples = self.get_sample_actors(obj)
+        first = samples[0] if samples else str(obj.actor)
+        others = obj.actor_count - 1
+        if others <= 0:
+            return f'{first} {obj.verb}'
+        if others == 1 and len(samples) > 1:
+            return f'{first} and {samples[1]} {obj.verb}'
+        noun = 'other' if others == 1 else 'others'
+        return f'{first} and {others} {noun} {obj.verb}'
+
+
+class MarkReadSerializer(serializers.Serializer):
+    # Omit both to mark everything read.
+    up_to_id = serializers.IntegerField(required=False, min_value=1)
+    before = serializers.DateTimeField(required=False)
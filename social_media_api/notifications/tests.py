@@ -1,3 +1,220 @@
-from django.test import TestCase
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from posts.models import Post
+from . import outbox, unread
+from .models import Notification, NotificationJob
+
+User = get_user_model()
+
+
+class OutboxTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.post = Post.objects.create(author=self.bob, title='Hello', content='World')
+        self.client.force_authenticate(self.alice)
+
+    def test_like_queues_job_instead_of_notification(self):
+        self.client.post(reverse('like-post', args=[self.post.id]))
+
+        self.assertFalse(Notification.objects.exists())
+        job = NotificationJob.objects.get()
+        self.assertEqual((job.recipient, job.actor, job.target_object_id), (self.bob, self.alice, self.post.id))
+
+    def test_worker_delivers_jobs_in_batches(self):
+        for i in range(5):
+            user = User.objects.create_user(username=f'user{i}', password='pass')
+            outbox.enqueue(self.bob.id, user.id, 'liked your post', self.post)
+
+        call_command('process_notifications', once=True, batch_size=2, stdout=StringIO())
+
+        self.assertFalse(NotificationJob.objects.exists())
+        notification = Notification.objects.get(recipient=self.bob)
+        self.assertEqual((notification.actor_count, notification.target), (5, self.post))
+
+    def test_claimed_jobs_are_not_handed_out_twice(self):
+        outbox.enqueue(self.bob.id, self.alice.id, 'liked your post', self.post)
+
+        self.assertEqual(len(outbox.claim(10, 'worker-a')), 1)
+        self.assertEqual(outbox.claim(10, 'worker-b'), [])
+
+    def test_failed_delivery_is_retried_then_parked(self):
+        outbox.enqueue(self.bob.id, self.alice.id, 'liked your post', self.post)
+        with self.settings(NOTIFICATIONS_MAX_ATTEMPTS=1):
+            outbox.release(outbox.claim(10), RuntimeError('boom'))
+
+        job = NotificationJob.objects.get()
+        self.assertEqual((job.attempts, job.failed, job.last_error), (1, True, 'boom'))
+        self.assertEqual(outbox.drain(), 0)
+
+
+class AggregationTests(APITestCase):
+    def setUp(self):
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.post = Post.objects.create(author=self.bob, title='Hello', content='World')
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', password='pass')
+            for i in range(5)
+        ]
+
+    def like(self, *fans):
+        for fan in fans:
+            outbox.enqueue(self.bob.id, fan.id, 'liked your post', self.post)
+        outbox.drain()
+
+    def test_likes_fold_into_one_notification(self):
+        self.like(*self.fans[:2])
+        self.like(*self.fans[2:])
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 5)
+        self.assertEqual(notification.actor, self.fans[-1])
+        self.assertEqual([s['username'] for s in notification.sample_actors], ['fan0', 'fan1', 'fan2'])
+
+        self.client.force_authenticate(self.bob)
+        data = self.client.get(reverse('notifications')).data['results'][0]
+        self.assertEqual(data['summary'], 'fan0 and 4 others liked your post')
+
+    def test_repeat_actors_are_counted_once(self):
+        # Within one batch, and across batches (like, unlike, like again).
+        self.like(self.fans[0], self.fans[1], self.fans[0])
+        self.like(self.fans[0])
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.actor, self.fans[0])
+        self.assertEqual(notification.actors.count(), 2)
+
+    def test_read_or_expired_notifications_are_not_reused(self):
+        self.like(self.fans[0])
+        Notification.objects.update(is_read=True)
+        self.like(self.fans[1])
+
+        with self.settings(NOTIFICATIONS_AGGREGATE_WINDOW=0):
+            self.like(self.fans[2])
+
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+class UnreadTests(APITestCase):
+    def setUp(self):
+        # The counter is only cached in a store every process can see.
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        shared = {**settings.CACHES, 'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+        }}
+        self.enterContext(override_settings(CACHES=shared))
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.posts = [
+            Post.objects.create(author=self.bob, title=f'Post {i}', content='...')
+            for i in range(3)
+        ]
+        self.client.force_authenticate(self.bob)
+
+    def notify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for post in self.posts:
+                outbox.enqueue(self.bob.id, self.alice.id, 'liked your post', post)
+            outbox.drain()
+
+    def unread_count(self):
+        return self.client.get(reverse('notifications-unread-count')).data['unread_count']
+
+    def test_counter_tracks_inserts_and_mark_read(self):
+        self.assertEqual(self.unread_count(), 0)
+        self.notify()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 3)
+
+        first = Notification.objects.order_by('id').first()
+        response = self.client.post(reverse('notifications-mark-read'), {'up_to_id': first.id})
+        self.assertEqual(response.data['marked_read'], 1)
+        self.assertEqual(self.unread_count(), 2)
+
+        self.client.post(reverse('notifications-mark-read'))
+        self.assertEqual(self.unread_count(), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_worker_increments_are_seen_by_web_requests(self):
+        self.assertEqual(self.unread_count(), 0)
+        for post in self.posts:
+            outbox.enqueue(self.bob.id, self.alice.id, 'liked your post', post)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_notifications', once=True, stdout=StringIO())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 3)
+
+    def test_process_local_cache_falls_back_to_count(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual(self.unread_count(), 0)
+            # As if delivered by a worker process with its own cache.
+            with mock.patch.object(unread, 'added'):
+                self.notify()
+            with self.assertNumQueries(1):
+                self.assertEqual(self.unread_count(), 3)
+
+    def test_list_is_keyset_paginated(self):
+        self.notify()
+
+        response = self.client.get(reverse('notifications'), {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+
+class TargetPrefetchTests(APITestCase):
+    def test_query_count_is_constant_across_target_types(self):
+        from posts.models import Comment
+
+        bob = User.objects.create_user(username='bob', password='pass')
+        for i in range(6):
+            fan = User.objects.create_user(username=f'fan{i}', password='pass')
+            post = Post.objects.create(author=bob, title=f'Post {i}', content='Long content ' * 20)
+            comment = Comment.objects.create(author=fan, post=post, content='Nice')
+            Notification.objects.create(recipient=bob, actor=fan, verb='liked your post', target=post)
+            Notification.objects.create(recipient=bob, actor=fan, verb='commented', target=comment)
+        Notification.objects.create(recipient=bob, actor=bob, verb='joined')
+
+        self.client.force_authenticate(bob)
+        # notifications joined to actors, then one query per target type
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('notifications'), {'page_size': 20})
+
+        results = response.data['results']
+        self.assertEqual(len(results), 13)
+        self.assertIsNone(results[0]['target'])
+        post_target = next(r['target'] for r in results if r['verb'] == 'liked your post')
+        self.assertEqual(post_target['type'], 'posts.post')
+        self.assertEqual(len(post_target['snippet']), 120)
+
+
+class AsyncNotificationTests(APITestCase):
+    def test_async_list_and_unread_count(self):
+        from rest_framework.authtoken.models import Token
+
+        bob = User.objects.create_user(username='bob', password='pass')
+        post = Post.objects.create(author=bob, title='Hello', content='World')
+        Notification.objects.create(recipient=bob, actor=bob, verb='liked your post', target=post)
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=bob).key)
+
+        response = self.client.get(reverse('async-notifications'))
+        self.assertEqual(response.json()['results'][0]['target']['title'], 'Hello')
+        response = self.client.get(reverse('async-notifications-unread-count'))
+        self.assertEqual(response.json(), {'unread_count': 1})
@@ -0,0 +1,76 @@
+"""
+Per-user unread notification counter.
+
+The count lives in the Django cache so a badge poll is a cache hit. It is
+bumped when notifications are inserted and decremented on mark-read; on a
+miss (or after NOTIFICATIONS_UNREAD_TTL) it is recomputed with an indexed
+COUNT over (recipient, is_read).
+
+Inserts happen in the ``process_notifications`` worker and mark-read in
+whichever web process served it, so the counter needs a cache shared by
+all of them. With a per-process cache every read is the COUNT instead.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from social_media_api.caches import is_shared
+
+from .models import Notification
+
+
+def _key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _ttl():
+    return getattr(settings, 'NOTIFICATIONS_UNREAD_TTL', 300)
+
+
+def _unread(user_id):
+    return Notification.objects.filter(recipient_id=user_id, is_read=False)
+
+
+def count(user_id):
+    if not is_shared():
+        return _unread(user_id).count()
+    value = cache.get(_key(user_id))
+    if value is None:
+        value = _unread(user_id).count()
+        cache.set(_key(user_id), value, _ttl())
+    return value
+
+
+async def acount(user_id):
+    if not is_shared():
+        return await _unread(user_id).acount()
+    value = await cache.aget(_key(user_id))
+    if value is None:
+        value = await _unread(user_id).acount()
+        await cache.aset(_key(user_id), value, _ttl())
+    return value
+
+
+def _adjust(user_id, delta):
+    if not is_shared():
+        return
+    try:
+        value = cache.incr(_key(user_id), delta)
+    except ValueError:
+        # Not cached: the next read recomputes it.
+        return
+    if value < 0:
+        cache.delete(_key(user_id))
+
+
+def added(user_id, amount=1):
+    if amount:
+        _adjust(user_id, amount)
+
+
+def read(user_id, amount):
+    if amount:
+        _adjust(user_id, -amount)
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
@@ -1,6 +1,13 @@
 from django.urls import path
-from .views import user_notifications
+from . import async_views
+from .views import mark_read, unread_count, user_notifications
 
 urlpatterns = [
     path('notifications/', user_notifications, name='notifications'),
+    path('notifications/unread_count/', unread_count, name='notifications-unread-count'),
+    path('notifications/mark_read/', mark_read, name='notifications-mark-read'),
+
+    # Async (ASGI) reads
+    path('async/notifications/', async_views.user_notifications, name='async-notifications'),
+    path('async/notifications/unread_count/', async_views.unread_count, name='async-notifications-unread-count'),
 ]
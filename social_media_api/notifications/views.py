@@ -2,16 +2,43 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from . import targets, unread
 from .models import Notification
-from .serializers import NotificationSerializer
+from .pagination import NotificationPagination
+from .serializers import MarkReadSerializer, NotificationSerializer
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_notifications(request):
-    notifications = Notification.objects.filter(
-        recipient=request.user
-    ).order_by('-timestamp')
+    notifications = targets.with_targets(
+        Notification.objects.filter(recipient=request.user)
+    )
 
-    serializer = NotificationSerializer(notifications, many=True)
-    return Response(serializer.data)
+    paginator = NotificationPagination()
+    page = paginator.paginate_queryset(notifications, request)
+    serializer = NotificationSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_count(request):
+    return Response({'unread_count': unread.count(request.user.id)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_read(request):
+    serializer = MarkReadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    notifications = Notification.objects.filter(recipient=request.user, is_read=False)
+    if 'up_to_id' in serializer.validated_data:
+        notifications = notifications.filter(id__lte=serializer.validated_data['up_to_id'])
+    if 'before' in serializer.validated_data:
+        notifications = notifications.filter(timestamp__lte=serializer.validated_data['before'])
+
+    updated = notifications.update(is_read=True)
+    unread.read(request.user.id, updated)
+    return Response({'marked_read': updated})
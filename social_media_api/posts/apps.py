@@ -3,3 +3,19 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from notifications import targets
+        from .models import Comment, Post
+
+        targets.register(
+            Post,
+            lambda post: {'title': post.title, 'snippet': post.content[:120]},
+            Post.objects.only('id', 'title', 'content'),
+        )
+        targets.register(
+            Comment,
+            lambda comment: {'post': comment.post_id, 'snippet': comment.content[:120]},
+            Comment.objects.only('id', 'post_id', 'content'),
+        )
@@ -0,0 +1,11 @@
+from social_media_api.async_api import async_api_view, render_page
+
+from .pagination import FeedPagination
+from .serializers import FlatPostSerializer
+
+
+@async_api_view
+async def feed(request):
+    paginator = FeedPagination()
+    page = await paginator.apaginate_feed(request.user, request, FlatPostSerializer.project)
+    return await render_page(paginator, FlatPostSerializer, page, request)
@@ -0,0 +1,102 @@
+"""
+Conditional GET support for the post and comment viewsets.
+
+A detail view's validators come from one cheap ``values_list`` of the
+validator fields. When the client's ``If-None-Match`` or
+``If-Modified-Since`` still matches, a 304 is returned before the row is
+loaded or serialized.
+
+A list page's ETag is a digest of a narrow page: the same filtered
+queryset projected to the primary key and the validator fields, paginated
+by the view's paginator, together with its count and links. Nothing is read
+beyond the page, and a 304 is returned before the full page is loaded or
+serialized. Results that are not a queryset (full-text search) are hashed
+after the normal list instead.
+
+Per-viewer boolean annotations named in ``etag_flags`` are validator
+fields too, read per row like the others, so liking a post or following
+its author changes the ETag of its detail view and of the list pages that
+show it.
+
+``Last-Modified`` is only sent when ``updated_at`` alone determines the
+body. Counters such as ``like_count`` change without touching
+``updated_at``, and list pages also change on deletes, so those are
+covered by the ETag alone.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.http import http_date
+
+
+def _etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+class ConditionalGetMixin:
+    # First field is the modification timestamp; the rest are counters that
+    # change the representation without bumping it.
+    etag_fields = ('updated_at',)
+    # Boolean annotations that depend on the viewer, e.g. liked_by_me.
+    etag_flags = ()
+
+    def _conditional(self, request, etag, last_modified=None):
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    def _finish(self, response, etag, last_modified=None):
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def _last_modified(self, row):
+        return row[0] if len(self.etag_fields) == 1 and not self.etag_flags else None
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = (
+            self.filter_queryset(self.get_queryset())
+            .filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+            .values_list(*self.etag_fields, *self.etag_flags)
+            .first()
+        )
+        if row is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = _etag('detail', kwargs[lookup_url_kwarg], row)
+        last_modified = self._last_modified(row)
+        not_modified = self._conditional(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        return self._finish(super().retrieve(request, *args, **kwargs), etag, last_modified)
+
+    def _list_etag(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not hasattr(queryset, 'values_list'):
+            return None
+        rows = queryset.values_list('pk', *self.etag_fields, *self.etag_flags)
+        if self.pagination_class is None:
+            return _etag('list', request.get_full_path(), list(rows))
+        # A paginator of its own, so the one list() uses starts afresh.
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return _etag('list', request.get_full_path(), paginator.get_paginated_response(page).data)
+
+    def list(self, request, *args, **kwargs):
+        etag = self._list_etag(request)
+        if etag is not None:
+            not_modified = self._conditional(request, etag)
+            if not_modified is not None:
+                return not_modified
+
+        response = super().list(request, *args, **kwargs)
+        if etag is None and response.status_code == 200:
+            etag = _etag('list', request.get_full_path(), response.data)
+            not_modified = self._conditional(request, etag)
+            if not_modified is not None:
+                return not_modified
+        return self._finish(response, etag)
@@ -0,0 +1,23 @@
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .search import SearchResults
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Replaces DRF's SearchFilter for posts.
+
+    ``?search=`` is answered from the full-text index in relevance order
+    rather than by ``icontains`` scans over every row.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_terms(request)
+        if not query or getattr(view, 'action', 'list') != 'list':
+            return queryset
+        return SearchResults(query, queryset)
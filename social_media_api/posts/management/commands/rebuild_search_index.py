@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for posts.'
+
+    def handle(self, *args, **options):
+        backend = search.get_write_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt search index with {type(backend).__name__}.'
+        ))
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import TimelineEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every feed timeline from the current follow graph.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete all existing timeline entries first.',
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            TimelineEntry.objects.all().delete()
+
+        written = 0
+        followers = User.objects.filter(following__isnull=False).distinct()
+        for follower in followers.iterator():
+            authors = follower.following.only('id', 'follower_count')
+            written += timeline.backfill_many(follower, authors)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} timeline entries.'))
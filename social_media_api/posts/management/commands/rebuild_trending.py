@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute trending scores from recent likes and comments.'
+
+    def handle(self, *args, **options):
+        count = trending.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt trending scores for {count} posts.'))
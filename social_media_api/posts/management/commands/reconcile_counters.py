@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Like, Post
+
+User = get_user_model()
+Follow = User.following.through
+
+
+def _count(queryset, field):
+    """Correlated COUNT(*) of ``queryset`` rows pointing at the outer pk."""
+    counted = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized like, comment and follow counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of primary keys recomputed per UPDATE.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        self.reconcile(Post, chunk_size, {
+            'like_count': _count(Like.objects.all(), 'post'),
+            'comment_count': _count(Comment.objects.all(), 'post'),
+        })
+        self.reconcile(User, chunk_size, {
+            'follower_count': _count(Follow.objects.all(), 'to_user'),
+            'following_count': _count(Follow.objects.all(), 'from_user'),
+        })
+
+    def reconcile(self, model, chunk_size, counters):
+        last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        updated = 0
+        for start in range(0, last_pk + 1, chunk_size):
+            with transaction.atomic():
+                updated += model.objects.filter(
+                    pk__gte=start,
+                    pk__lt=start + chunk_size
+                ).update(**counters)
+
+        name = model._meta.verbose_name_plural
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters for {updated} {name}.'))
@@ -0,0 +1,326 @@
+"""
+Fill the database with a synthetic social graph for load testing.
+
+Everything is generated from one ``random.Random(seed)``, so the same
+arguments always produce the same graph. Popularity follows a power law:
+every user gets a Zipf weight, follow targets are drawn in proportion to
+it and posts by popular authors collect more likes and comments.
+
+Rows are streamed through chunked ``bulk_create`` calls and never held
+beyond one chunk. Primary keys for users, posts, comments and
+notifications are assigned up front so that foreign keys and comment
+paths can be written without reading anything back. Derived data is built with set-based queries at
+the end: follower counters, fan-out timelines, the search index and the
+trending scores.
+"""
+import math
+import random
+import time
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from notifications.models import Notification, NotificationActor
+from posts import timeline
+from posts.models import Comment, Like, Post, TimelineEntry
+
+User = get_user_model()
+Follow = User.following.through
+
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+    'tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam '
+    'quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo'
+).split()
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created/updated times set on the objects."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class ChunkedWriter:
+    """
+    Buffers unsaved objects and bulk-inserts them ``chunk_size`` at a time.
+
+    All buffers are flushed together, in the order the models were given,
+    so rows are always written after the rows they reference.
+    """
+
+    def __init__(self, models, chunk_size):
+        self.buffers = {model: [] for model in models}
+        self.chunk_size = chunk_size
+        self.written = {model: 0 for model in models}
+
+    def add(self, obj):
+        buffer = self.buffers[type(obj)]
+        buffer.append(obj)
+        if len(buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        with transaction.atomic():
+            for model, buffer in self.buffers.items():
+                if buffer:
+                    model.objects.bulk_create(buffer, batch_size=self.chunk_size)
+                    self.written[model] += len(buffer)
+                    buffer.clear()
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic, power-law social graph for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--follows', type=float, default=50, help='Mean accounts followed per user.')
+        parser.add_argument('--posts', type=float, default=10, help='Mean posts per user.')
+        parser.add_argument('--likes', type=float, default=5, help='Mean likes per post.')
+        parser.add_argument('--comments', type=float, default=2, help='Mean comments per post.')
+        parser.add_argument('--reply-rate', type=float, default=0.3, help='Share of comments that are replies.')
+        parser.add_argument('--alpha', type=float, default=1.0, help='Zipf exponent of user popularity.')
+        parser.add_argument('--days', type=int, default=30, help='Spread activity over this many days.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='seed', help='Username prefix; the user id is appended.')
+        parser.add_argument('--password', default='password', help='Password for every generated user.')
+        parser.add_argument(
+            '--skip-derived',
+            action='store_true',
+            help='Do not build timelines, the search index or trending scores.',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options['days'])
+        self.chunk_size = options['chunk_size']
+
+        self.first_user = self.next_id(User)
+        self.first_post = self.next_id(Post)
+        self.next_comment = self.next_id(Comment)
+        self.next_notification = self.next_id(Notification)
+        self.post_type = ContentType.objects.get_for_model(Post)
+
+        n = options['users']
+        # Zipf weights over a random ranking, as cumulative weights for bisect.
+        ranks = list(range(n))
+        self.rng.shuffle(ranks)
+        self.weights = [1 / (rank + 1) ** options['alpha'] for rank in ranks]
+        self.cum_weights = list(accumulate(self.weights))
+        self.mean_weight = self.cum_weights[-1] / n
+
+        with explicit_timestamps(Post, Like, Comment, Notification):
+            self.step('users', self.create_users)
+            self.step('follows', self.create_follows)
+            self.step('posts and engagement', self.create_posts)
+        self.reset_sequences()
+        if not options['skip_derived']:
+            self.step('timelines', self.create_timelines)
+            self.step('search index', lambda: call_command('rebuild_search_index', stdout=self.stdout))
+            self.step('trending scores', lambda: call_command('rebuild_trending', stdout=self.stdout))
+
+    def step(self, name, func):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        summary = f' ({result})' if isinstance(result, str) else ''
+        self.stdout.write(self.style.SUCCESS(f'Seeded {name}{summary} in {elapsed:.1f}s.'))
+
+    @staticmethod
+    def next_id(model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def user_id(self, index):
+        return self.first_user + index
+
+    def username(self, user_id):
+        return f"{self.options['prefix']}{user_id}"
+
+    def count(self, mean, scale=1.0):
+        """Heavy-tailed (log-normal) count with the given mean."""
+        if mean <= 0:
+            return 0
+        return int(self.rng.lognormvariate(math.log(mean * scale) - 0.5, 1.0))
+
+    def moment(self, after):
+        return after + (self.now - after) * self.rng.random()
+
+    def text(self, words):
+        return ' '.join(self.rng.choices(WORDS, k=words))
+
+    def create_users(self):
+        password = make_password(self.options['password'])
+        writer = ChunkedWriter([User], self.chunk_size)
+        for index in range(self.options['users']):
+            user_id = self.user_id(index)
+            writer.add(User(
+                id=user_id,
+                username=self.username(user_id),
+                password=password,
+                date_joined=self.start,
+                bio=self.text(8),
+            ))
+        writer.flush()
+        return f'{writer.written[User]} rows'
+
+    def create_follows(self):
+        n = self.options['users']
+        total = self.cum_weights[-1]
+        follower_counts = [0] * n
+        writer = ChunkedWriter([Follow], self.chunk_size)
+        following_counts = []
+        for index in range(n):
+            wanted = min(n - 1, self.count(self.options['follows']))
+            targets = set()
+            # Rejection sampling keeps this O(wanted log n) for sparse graphs.
+            for _ in range(wanted * 4):
+                if len(targets) >= wanted:
+                    break
+                target = bisect(self.cum_weights, self.rng.random() * total)
+                if target != index and target < n:
+                    targets.add(target)
+            for target in sorted(targets):
+                follower_counts[target] += 1
+                writer.add(Follow(from_user_id=self.user_id(index), to_user_id=self.user_id(target)))
+            following_counts.append(len(targets))
+        writer.flush()
+
+        for start in range(0, n, self.chunk_size):
+            users = [
+                User(id=self.user_id(index), follower_count=follower_counts[index], following_count=following_counts[index])
+                for index in range(start, min(n, start + self.chunk_size))
+            ]
+            User.objects.bulk_update(users, ['follower_count', 'following_count'])
+        return f'{writer.written[Follow]} rows'
+
+    def create_posts(self):
+        n = self.options['users']
+        writer = ChunkedWriter([Post, Like, Comment, Notification, NotificationActor], self.chunk_size)
+        post_id = self.first_post
+        for index in range(n):
+            popularity = self.weights[index] / self.mean_weight
+            for _ in range(self.count(self.options['posts'])):
+                self.create_post(writer, post_id, index, popularity)
+                post_id += 1
+        writer.flush()
+        return ', '.join(f'{count} {model._meta.verbose_name_plural}' for model, count in writer.written.items())
+
+    def create_post(self, writer, post_id, author_index, popularity):
+        n = self.options['users']
+        author_id = self.user_id(author_index)
+        created_at = self.moment(self.start)
+        likers = self.rng.sample(range(n), min(n, self.count(self.options['likes'], popularity)))
+        commenters = self.rng.choices(range(n), k=self.count(self.options['comments'], popularity))
+
+        writer.add(Post(
+            id=post_id,
+            author_id=author_id,
+            title=self.text(5).capitalize(),
+            content=self.text(40),
+            created_at=created_at,
+            updated_at=created_at,
+            like_count=len(likers),
+            comment_count=len(commenters),
+        ))
+
+        liked_at = sorted(self.moment(created_at) for _ in likers)
+        for liker, when in zip(likers, liked_at):
+            writer.add(Like(user_id=self.user_id(liker), post_id=post_id, created_at=when))
+
+        comments = []
+        commented_at = sorted(self.moment(created_at) for _ in commenters)
+        for commenter, when in zip(commenters, commented_at):
+            comment_id = self.next_comment
+            self.next_comment += 1
+            segment = str(comment_id).zfill(Comment.PATH_SEGMENT_LENGTH)
+            parent_id, path = None, segment
+            if comments and self.rng.random() < self.options['reply_rate']:
+                parent_id, parent_path = self.rng.choice(comments)
+                if parent_path.count('/') + 1 < Comment.MAX_DEPTH:
+                    path = f'{parent_path}/{segment}'
+                else:
+                    parent_id = None
+            comments.append((comment_id, path))
+            writer.add(Comment(
+                id=comment_id,
+                post_id=post_id,
+                author_id=self.user_id(commenter),
+                content=self.text(12),
+                parent_id=parent_id,
+                path=path,
+                created_at=when,
+                updated_at=when,
+            ))
+
+        # One aggregated notification per post, as notifications.aggregation
+        # would leave it.
+        actors = [self.user_id(liker) for liker in likers if liker != author_index]
+        if actors:
+            notification_id = self.next_notification
+            self.next_notification += 1
+            writer.add(Notification(
+                id=notification_id,
+                recipient_id=author_id,
+                actor_id=actors[-1],
+                verb='liked your post',
+                target_content_type=self.post_type,
+                target_object_id=post_id,
+                timestamp=liked_at[-1],
+                is_read=self.rng.random() < 0.7,
+                actor_count=len(actors),
+                sample_actors=[{'id': actor, 'username': self.username(actor)} for actor in actors[:3]],
+            ))
+            for actor in actors:
+                writer.add(NotificationActor(notification_id=notification_id, actor_id=actor))
+
+    def create_timelines(self):
+        """Fan seeded posts out to followers with one INSERT ... SELECT per chunk of readers."""
+        quote = connection.ops.quote_name
+        sql = f"""
+            INSERT INTO {quote(TimelineEntry._meta.db_table)} (user_id, post_id, author_id, created_at)
+            SELECT f.from_user_id, p.id, p.author_id, p.created_at
+            FROM {quote(Follow._meta.db_table)} f
+            JOIN {quote(Post._meta.db_table)} p ON p.author_id = f.to_user_id
+            JOIN {quote(User._meta.db_table)} a ON a.id = f.to_user_id
+            WHERE f.from_user_id >= %s AND f.from_user_id < %s
+              AND p.id >= %s AND a.follower_count < %s
+        """
+        written = 0
+        last_user = self.user_id(self.options['users'])
+        for start in range(self.first_user, last_user, self.chunk_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, [start, min(last_user, start + self.chunk_size), self.first_post, timeline.fanout_limit()])
+                written += cursor.rowcount
+        return f'{written} rows'
+
+    def reset_sequences(self):
+        # Explicit primary keys leave PostgreSQL sequences behind.
+        statements = connection.ops.sequence_reset_sql(no_style(), [User, Post, Comment, Notification])
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
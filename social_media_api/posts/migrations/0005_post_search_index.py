@@ -0,0 +1,63 @@
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts "
+    "USING fts5(title, content, tokenize='porter unicode61')",
+    "INSERT INTO posts_post_fts (rowid, title, content) "
+    "SELECT id, title, content FROM posts_post",
+]
+SQLITE_REVERSE = [
+    "DROP TABLE IF EXISTS posts_post_fts",
+]
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE posts_post ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX posts_post_search_idx ON posts_post USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS posts_post_search_idx",
+    "ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _fts5_enabled(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+    elif connection.vendor == 'sqlite' and _fts5_enabled(connection):
+        _run(schema_editor, SQLITE_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_REVERSE)
+    elif connection.vendor == 'sqlite':
+        _run(schema_editor, SQLITE_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
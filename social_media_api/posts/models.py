@@ -15,6 +15,20 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized counters, see `manage.py reconcile_counters`.
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    # Decayed activity relative to TrendingState.epoch, see posts.trending.
+    hot_score = models.FloatField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+            models.Index(fields=['author', '-created_at'], name='post_author_recent_idx'),
+            models.Index(fields=['-hot_score'], name='post_hot_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -34,6 +48,47 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Threading: `parent` is the comment being replied to and `path` the
+    # zero-padded ids from the root down, so ordering by path walks a
+    # thread depth-first and a range of paths selects a whole subtree.
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        null=True,
+        blank=True
+    )
+    path = models.CharField(max_length=255, blank=True, editable=False)
+
+    PATH_SEGMENT_LENGTH = 10
+    MAX_DEPTH = 255 // (PATH_SEGMENT_LENGTH + 1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_recent_idx'),
+            models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ]
+
+    @property
+    def depth(self):
+        return self.path.count('/')
+
+    @staticmethod
+    def subtree(path):
+        """
+        Lookups for the comment at ``path`` and all its replies. A range
+        rather than ``startswith``, which SQLite cannot run on the index:
+        '/' sorts just below '0', so every descendant sorts before path + '0'.
+        """
+        return {'path__gte': path, 'path__lt': path + '0'}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.path:
+            segment = str(self.pk).zfill(self.PATH_SEGMENT_LENGTH)
+            self.path = f'{self.parent.path}/{segment}' if self.parent_id else segment
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
     def __str__(self):
         return f'Comment by {self.author}'
 
@@ -54,4 +109,40 @@ class Like(models.Model):
         unique_together = ('user', 'post')
 
     def __str__(self):
-        return f'{self.user} likes {self.post}'
\ No newline at end of file
+        return f'{self.user} likes {self.post}'
+
+
+class TimelineEntry(models.Model):
+    # Materialized feed row: one per (follower, post), written on fan-out.
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    # Copied from the post so the feed can be read by (user, created_at).
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_recent_idx'),
+            models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} in timeline of {self.user}'
+
+
+class TrendingState(models.Model):
+    """Single row holding the reference time ``Post.hot_score`` is relative to."""
+    epoch = models.DateTimeField()
@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework.settings import api_settings
+
+from social_media_api.pagination import KeysetPagination
+
+from . import timeline
+from .models import Post
+
+
+class FeedPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+    page_size = getattr(settings, 'FEED_PAGE_SIZE', api_settings.PAGE_SIZE)
+
+    def _feed_args(self, request):
+        position = self.start_page(request, Post)
+        limit = self.page_size if self.refreshing else self.page_size + 1
+        return position, self.refreshing, limit
+
+    def paginate_feed(self, user, request, project):
+        """A page of ``timeline.feed_rows``, with the same cursors as a queryset page."""
+        return self.finish_page(timeline.feed_rows(user, *self._feed_args(request), project=project))
+
+    async def apaginate_feed(self, user, request, project):
+        return self.finish_page(await timeline.afeed_rows(user, *self._feed_args(request), project=project))
+
+
+class CommentPagination(KeysetPagination):
+    # Conversation order: oldest first.
+    ordering = ('created_at', 'id')
+
+
+class ThreadPagination(KeysetPagination):
+    # Depth-first walk of a thread via the materialized path.
+    ordering = ('path',)
@@ -0,0 +1,196 @@
+"""
+Full-text search over posts.
+
+On SQLite the posts are mirrored into an FTS5 table (``posts_post_fts``)
+kept current by the post_save / post_delete signals. On PostgreSQL the
+``search_vector`` generated column and its GIN index, both created by
+migration 0005, are maintained by the database itself. Any other backend
+falls back to ``icontains`` matching.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+_fts_available = {}
+
+
+def _connection():
+    return connections[router.db_for_read(Post)]
+
+
+def _write_connection():
+    return connections[router.db_for_write(Post)]
+
+
+def fts_available(connection):
+    if connection.alias not in _fts_available:
+        with connection.cursor() as cursor:
+            tables = connection.introspection.table_names(cursor)
+        _fts_available[connection.alias] = FTS_TABLE in tables
+    return _fts_available[connection.alias]
+
+
+def fts5_query(query):
+    """Quote each term so user input can never be parsed as FTS5 syntax."""
+    terms = re.findall(r'\w+', query)
+    return ' '.join('"%s"' % term for term in terms)
+
+
+class SQLiteSearchBackend:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def count(self, query):
+        match = fts5_query(query)
+        if not match:
+            return 0
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [match]
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, query, offset, limit):
+        match = fts5_query(query)
+        if not match:
+            return []
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [match, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, post):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)',
+                [post.pk, post.title, post.content]
+            )
+
+    def remove(self, post_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, content) '
+                f'SELECT id, title, content FROM posts_post'
+            )
+
+
+class PostgresSearchBackend:
+    # `search_vector` is a generated column, so there is nothing to index.
+    tsquery = "websearch_to_tsquery('english', %s)"
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def count(self, query):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM posts_post WHERE search_vector @@ {self.tsquery}',
+                [query]
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, query, offset, limit):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id FROM posts_post, {self.tsquery} AS q '
+                f'WHERE search_vector @@ q '
+                f'ORDER BY ts_rank(search_vector, q) DESC, id DESC LIMIT %s OFFSET %s',
+                [query, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class FallbackSearchBackend:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def matches(self, query):
+        queryset = Post.objects.using(self.connection.alias)
+        for term in query.split():
+            queryset = queryset.filter(Q(title__icontains=term) | Q(content__icontains=term))
+        return queryset
+
+    def count(self, query):
+        return self.matches(query).count()
+
+    def ranked_ids(self, query, offset, limit):
+        ids = self.matches(query).order_by('-created_at', '-id').values_list('id', flat=True)
+        return list(ids[offset:offset + limit])
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+def get_backend(connection=None):
+    connection = connection or _connection()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend(connection)
+    if connection.vendor == 'sqlite' and fts_available(connection):
+        return SQLiteSearchBackend(connection)
+    return FallbackSearchBackend(connection)
+
+
+def get_write_backend():
+    return get_backend(_write_connection())
+
+
+class SearchResults:
+    """
+    Lazy, relevance-ordered result list.
+
+    Django's Paginator only needs ``count()`` and slicing, so each page runs
+    one ranked id query against the index plus one ``in_bulk`` for the rows.
+    """
+
+    def __init__(self, query, queryset, backend=None):
+        self.query = query
+        self.queryset = queryset
+        self.backend = backend or get_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = self.count() if key.stop is None else key.stop
+        ids = self.backend.ranked_ids(self.query, start, max(stop - start, 0))
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
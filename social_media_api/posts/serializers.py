@@ -4,6 +4,10 @@ from .models import Post, Comment
 
 class PostSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
+    # Annotated by posts.viewer_state; a post just created by the viewer
+    # carries neither annotation and is neither liked nor followed.
+    liked_by_me = serializers.SerializerMethodField()
+    author_followed_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -14,12 +18,73 @@ class PostSerializer(serializers.ModelSerializer):
             'content',
             'created_at',
             'updated_at',
+            'like_count',
+            'comment_count',
+            'liked_by_me',
+            'author_followed_by_me',
         ]
+        read_only_fields = ['like_count', 'comment_count']
+
+    def get_liked_by_me(self, post):
+        return getattr(post, 'liked_by_me', False)
+
+    def get_author_followed_by_me(self, post):
+        return getattr(post, 'author_followed_by_me', False)
+
+
+class FlatPostSerializer:
+    """
+    Read-only fast path for post lists.
+
+    Works on rows from ``project()`` -- a ``.values()`` query with the
+    author's username joined in SQL and the viewer flags annotated by
+    ``posts.viewer_state`` -- and produces the same JSON as
+    ``PostSerializer`` without any per-field DRF machinery.
+    """
+    # Output key -> values() lookup, in PostSerializer field order.
+    columns = {
+        'id': 'id',
+        'author': 'author__username',
+        'title': 'title',
+        'content': 'content',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'like_count': 'like_count',
+        'comment_count': 'comment_count',
+        'liked_by_me': 'liked_by_me',
+        'author_followed_by_me': 'author_followed_by_me',
+    }
+    datetime_fields = ('created_at', 'updated_at')
+
+    def __init__(self, instance, many=True, context=None):
+        self.instance = instance
+
+    @classmethod
+    def project(cls, queryset):
+        return queryset.values(*cls.columns.values())
+
+    @property
+    def data(self):
+        datetime_field = serializers.DateTimeField()
+        columns = list(self.columns.items())
+        rows = []
+        for row in self.instance:
+            data = {key: row[lookup] for key, lookup in columns}
+            for key in self.datetime_fields:
+                data[key] = datetime_field.to_representation(data[key])
+            rows.append(data)
+        return rows
 
 
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
     post = serializers.PrimaryKeyRelatedField(queryset=Post.objects.all())
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Comment.objects.all(),
+        required=False,
+        allow_null=True
+    )
+    depth = serializers.ReadOnlyField()
 
     class Meta:
         model = Comment
@@ -30,4 +95,39 @@ class CommentSerializer(serializers.ModelSerializer):
             'content',
             'created_at',
             'updated_at',
+            'parent',
+            'depth',
         ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if isinstance(self.instance, Comment):
+            # Moving a comment would leave its path and both posts'
+            # comment_count wrong, so placement is fixed at creation.
+            for name in ('post', 'parent'):
+                fields[name].read_only = True
+        return fields
+
+    def get_post(self, attrs):
+        return attrs.get('post') or getattr(self.instance, 'post', None)
+
+    def validate(self, attrs):
+        parent = attrs.get('parent')
+        if parent is not None and isinstance(self.instance, Comment):
+            if parent.path.startswith(self.instance.path):
+                raise serializers.ValidationError({'parent': 'A comment cannot reply to itself or its replies.'})
+        if parent is not None:
+            post = self.get_post(attrs)
+            if post is not None and parent.post_id != post.pk:
+                raise serializers.ValidationError({'parent': 'Reply must be on the same post.'})
+            if parent.depth + 1 >= Comment.MAX_DEPTH:
+                raise serializers.ValidationError({'parent': 'Thread is too deep.'})
+        return attrs
+
+
+class PostCommentSerializer(CommentSerializer):
+    """Comments created under /posts/<id>/comments/, where the post comes from the URL."""
+    post = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    def get_post(self, attrs):
+        return self.context['post']
@@ -1,3 +1,819 @@
-from django.test import TestCase
+import gzip
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from social_media_api import metrics
+from social_media_api.replicas import ReplicaRouter, ReplicaStickinessMiddleware
+
+from . import timeline, trending
+from .models import Comment, Like, Post, TimelineEntry
+from .serializers import CommentSerializer, FlatPostSerializer, PostSerializer
+from .viewer_state import with_viewer_state
+
+User = get_user_model()
+
+
+class TimelineTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.client.force_authenticate(self.alice)
+
+    def follow(self, user):
+        return self.client.post(reverse('follow-user', args=[user.id]))
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        self.follow(self.bob)
+        self.client.force_authenticate(self.bob)
+        self.client.post(reverse('post-list'), {'title': 'Hi', 'content': 'Hello'})
+
+        post = Post.objects.get(title='Hi')
+        self.assertTrue(TimelineEntry.objects.filter(user=self.alice, post=post).exists())
+
+        self.client.force_authenticate(self.alice)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual([p['id'] for p in response.data['results']], [post.id])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        post = Post.objects.create(author=self.bob, title='Old', content='Older post')
+
+        self.follow(self.bob)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.alice, post=post).exists())
+
+        self.client.post(reverse('unfollow-user', args=[self.bob.id]))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.alice).exists())
+        self.assertEqual(self.client.get(reverse('feed')).data['results'], [])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_high_fanout_author_is_read_on_demand(self):
+        self.follow(self.bob)
+        self.bob.refresh_from_db()
+        self.client.force_authenticate(self.bob)
+        self.client.post(reverse('post-list'), {'title': 'Big', 'content': 'News'})
+
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        self.client.force_authenticate(self.alice)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual([p['title'] for p in response.data['results']], ['Big'])
+
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=2)
+    def test_pulled_posts_are_pushed_when_the_author_drops_under_the_limit(self):
+        carol = User.objects.create_user(username='carol', password='pass')
+        self.follow(self.bob)
+        self.client.force_authenticate(carol)
+        self.follow(self.bob)
+        self.bob.refresh_from_db()
+        self.client.force_authenticate(self.bob)
+        self.client.post(reverse('post-list'), {'title': 'Big', 'content': 'News'})
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        self.client.force_authenticate(carol)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('unfollow-user', args=[self.bob.id]))
+
+        self.client.force_authenticate(self.alice)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual([p['title'] for p in response.data['results']], ['Big'])
+        self.assertTrue(TimelineEntry.objects.filter(user=self.alice, author=self.bob).exists())
+
+    def test_rebuild_backfills_each_follower_in_one_query(self):
+        carol = User.objects.create_user(username='carol', password='pass')
+        for author in (self.bob, carol):
+            Post.objects.create(author=author, title=f'By {author.username}', content='...')
+            self.follow(author)
+        TimelineEntry.objects.all().delete()
+
+        # followers, then per follower: authors, ranked posts, insert
+        with self.assertNumQueries(4):
+            call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(TimelineEntry.objects.filter(user=self.alice).count(), 2)
+
+
+class FeedMergeTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.star = User.objects.create_user(username='star', password='pass')
+        self.fan = User.objects.create_user(username='fan', password='pass')
+        self.client.force_authenticate(self.fan)
+        self.client.post(reverse('follow-user', args=[self.star.id]))
+        self.client.force_authenticate(self.alice)
+        for user in (self.bob, self.star):
+            self.client.post(reverse('follow-user', args=[user.id]))
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=2)
+    def test_pushed_and_pulled_posts_are_merged_in_order(self):
+        self.star.refresh_from_db()
+        for i in range(6):
+            self.client.force_authenticate(self.star if i % 2 else self.bob)
+            self.client.post(reverse('post-list'), {'title': f'Post {i}', 'content': '...'})
+        self.assertEqual(TimelineEntry.objects.filter(user=self.alice).count(), 3)
+        self.client.force_authenticate(self.alice)
+
+        # pushed keys, pulled keys, then the page's rows by id
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('feed'), {'page_size': 4})
+        seen = [p['title'] for p in response.data['results']]
+        response = self.client.get(response.data['next'])
+        seen += [p['title'] for p in response.data['results']]
+        self.assertEqual(seen, [f'Post {i}' for i in reversed(range(6))])
+        self.assertIsNone(response.data['next'])
+
+    def test_pushed_posts_are_an_index_range_scan(self):
+        pushed, _ = timeline._feed_keys(self.alice, None, False, 20)
+        plan = pushed.explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn('timeline_user_recent_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FeedPaginationTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.client.force_authenticate(self.alice)
+        self.client.post(reverse('follow-user', args=[self.bob.id]))
+        for i in range(5):
+            self.publish(f'Post {i}')
+
+    def publish(self, title):
+        self.client.force_authenticate(self.bob)
+        self.client.post(reverse('post-list'), {'title': title, 'content': '...'})
+        self.client.force_authenticate(self.alice)
+
+    def titles(self, response):
+        return [p['title'] for p in response.data['results']]
+
+    def test_cursor_walks_every_post_once(self):
+        response = self.client.get(reverse('feed'), {'page_size': 2})
+        seen = self.titles(response)
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += self.titles(response)
+
+        self.assertEqual(seen, [f'Post {i}' for i in reversed(range(5))])
+
+    def test_since_returns_only_newer_posts(self):
+        response = self.client.get(reverse('feed'), {'page_size': 2})
+        refresh = response.data['previous']
+
+        self.publish('Fresh')
+
+        response = self.client.get(refresh)
+        self.assertEqual(self.titles(response), ['Fresh'])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('feed'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.post = Post.objects.create(author=self.bob, title='Hello', content='World')
+        self.client.force_authenticate(self.alice)
+
+    def test_like_and_comment_counters(self):
+        self.client.post(reverse('like-post', args=[self.post.id]))
+        self.client.post(reverse('like-post', args=[self.post.id]))
+        self.client.post(reverse('comment-list'), {'post': self.post.id, 'content': 'Nice'})
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+        self.client.post(reverse('unlike-post', args=[self.post.id]))
+        comment = Comment.objects.get()
+        self.client.delete(reverse('comment-detail', args=[comment.id]))
+
+        response = self.client.get(reverse('post-detail', args=[self.post.id]))
+        self.assertEqual((response.data['like_count'], response.data['comment_count']), (0, 0))
+
+    def test_follow_counters(self):
+        url = reverse('follow-user', args=[self.bob.id])
+        self.client.post(url)
+        self.client.post(url)
+
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.following_count, self.bob.follower_count), (1, 1))
+
+        self.client.post(reverse('unfollow-user', args=[self.bob.id]))
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.follower_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.create(user=self.alice, post=self.post)
+        self.alice.following.add(self.bob)
+        Post.objects.update(comment_count=7)
+
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+        self.assertEqual(self.bob.follower_count, 1)
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.client.force_authenticate(self.alice)
+
+    def create(self, title, content):
+        response = self.client.post(reverse('post-list'), {'title': title, 'content': content})
+        return response.data['id']
+
+    def search(self, query):
+        response = self.client.get(reverse('post-list'), {'search': query})
+        return [p['id'] for p in response.data['results']], response.data['count']
+
+    def test_results_are_ranked_and_paginated(self):
+        weak = self.create('Gardening', 'Some notes on django and tomatoes')
+        strong = self.create('Django tips', 'Django django django')
+        self.create('Cooking', 'Nothing relevant here')
+
+        ids, count = self.search('django')
+        self.assertEqual(count, 2)
+        self.assertEqual(ids, [strong, weak])
+
+    def test_index_follows_updates_and_deletes(self):
+        post_id = self.create('Title', 'Stale words')
+        self.client.patch(reverse('post-detail', args=[post_id]), {'content': 'Fresh words'})
+
+        self.assertEqual(self.search('stale')[0], [])
+        self.assertEqual(self.search('fresh')[0], [post_id])
+
+        self.client.delete(reverse('post-detail', args=[post_id]))
+        self.assertEqual(self.search('fresh')[0], [])
+
+    def test_query_syntax_is_escaped(self):
+        self.create('Quotes', 'He said "hello" AND left')
+        self.assertEqual(self.search('"hello" AND (')[1], 1)
+
+
+class AsyncFeedTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.client.force_authenticate(self.alice)
+        self.client.post(reverse('follow-user', args=[self.bob.id]))
+        self.client.force_authenticate(self.bob)
+        for i in range(3):
+            self.client.post(reverse('post-list'), {'title': f'Post {i}', 'content': '...'})
+        self.client.force_authenticate(None)
+
+        token = Token.objects.create(user=self.alice)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def test_async_feed_matches_sync_feed(self):
+        sync = self.client.get(reverse('feed'), {'page_size': 2})
+        async_ = self.client.get(reverse('async-feed'), {'page_size': 2})
+
+        self.assertEqual(async_.status_code, 200)
+        self.assertEqual(async_.json()['results'], sync.json()['results'])
+        self.assertIsNotNone(async_.json()['next'])
+
+    def test_async_feed_requires_token(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('async-feed')).status_code, 401)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.post = Post.objects.create(author=self.alice, title='Hello', content='World')
+        self.comment = Comment.objects.create(author=self.alice, post=self.post, content='First')
+        self.client.force_authenticate(self.alice)
+
+    def test_detail_returns_304_until_post_changes(self):
+        url = reverse('post-detail', args=[self.post.id])
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(reverse('like-post', args=[self.post.id]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['like_count'], 1)
+
+    def test_comment_detail_honours_if_modified_since(self):
+        url = reverse('comment-detail', args=[self.comment.id])
+        last_modified = self.client.get(url)['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_changes_on_delete(self):
+        url = reverse('post-list')
+        Post.objects.create(author=self.alice, title='Second', content='...')
+        etag = self.client.get(url)['ETag']
+
+        # COUNT and the narrow validator page only; the posts are not loaded.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.delete(reverse('post-detail', args=[self.post.id]))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class RenderingTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        for i in range(30):
+            Post.objects.create(author=self.alice, title=f'Post {i} – ünïcode', content='Lorem ipsum ' * 10)
+        self.client.force_authenticate(self.alice)
+
+    def test_fast_renderer_matches_drf_output(self):
+        from rest_framework.renderers import JSONRenderer
+        from social_media_api.renderers import FastJSONParser, FastJSONRenderer
+
+        Post.objects.create(author=self.alice, title='Separators', content='line\u2028paragraph\u2029end')
+        data = PostSerializer(Post.objects.select_related('author'), many=True).data
+        rendered = FastJSONRenderer().render(data)
+        self.assertIn(b'line\\u2028paragraph\\u2029end', rendered)
+        self.assertEqual(rendered, JSONRenderer().render(data))
+        self.assertEqual(FastJSONParser().parse(BytesIO(rendered)), json.loads(rendered))
+
+    def test_responses_are_compressed_when_accepted(self):
+        url = reverse('post-list')
+        plain = self.client.get(url)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0.8')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class FlatPostSerializerTests(APITestCase):
+    def setUp(self):
+        self.authors = [User.objects.create_user(username=f'author{i}', password='pass') for i in range(3)]
+        for i in range(9):
+            Post.objects.create(author=self.authors[i % 3], title=f'Post {i}', content='...', like_count=i)
+        self.client.force_authenticate(self.authors[0])
+
+    def test_output_matches_post_serializer(self):
+        posts = with_viewer_state(Post.objects.order_by('id'), self.authors[0])
+        flat = FlatPostSerializer(FlatPostSerializer.project(posts)).data
+        self.assertEqual(flat, PostSerializer(posts, many=True).data)
+        self.assertEqual(list(flat[0]), list(PostSerializer.Meta.fields))
+
+    def test_unpaginated_list_uses_flat_rows(self):
+        with mock.patch('posts.views.PostViewSet.pagination_class', None):
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(len(response.data), 9)
+        self.assertEqual(list(response.data[0]), list(PostSerializer.Meta.fields))
+
+    def test_list_page_does_not_query_per_row(self):
+        # COUNT and validator page for the ETag, then COUNT and one joined SELECT
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.data['count'], 9)
+
+
+class CommentThreadTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.post = Post.objects.create(author=self.alice, title='Hello', content='World')
+        self.url = reverse('post-comments', args=[self.post.id])
+        self.client.force_authenticate(self.alice)
+
+    def comment(self, content, parent=None):
+        data = {'content': content}
+        if parent is not None:
+            data['parent'] = parent
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def test_top_level_comments_are_keyset_paginated(self):
+        for i in range(3):
+            self.comment(f'Comment {i}')
+
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual([c['content'] for c in response.data['results']], ['Comment 0', 'Comment 1'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([c['content'] for c in response.data['results']], ['Comment 2'])
+        self.assertIsNone(response.data['next'])
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+
+    def test_replies_and_threads(self):
+        root = self.comment('root')
+        reply = self.comment('reply', parent=root)
+        self.comment('nested', parent=reply)
+        self.comment('second reply', parent=root)
+        self.comment('other root')
+
+        response = self.client.get(self.url)
+        self.assertEqual([c['content'] for c in response.data['results']], ['root', 'other root'])
+
+        response = self.client.get(self.url, {'parent': root})
+        self.assertEqual([c['content'] for c in response.data['results']], ['reply', 'second reply'])
+
+        # one query for the post, one for the root, one for the page
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'thread': root})
+        results = response.data['results']
+        self.assertEqual([c['content'] for c in results], ['root', 'reply', 'nested', 'second reply'])
+        self.assertEqual([c['depth'] for c in results], [0, 1, 2, 1])
+
+    def test_thread_is_an_index_range_scan(self):
+        root = Comment.objects.get(pk=self.comment('root'))
+        thread = Comment.objects.filter(post=self.post, **Comment.subtree(root.path)).order_by('path')
+        plan = thread.explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn('comment_post_path_idx (post_id=? AND path>? AND path<?)', plan)
+
+    def test_reply_must_be_on_the_same_post(self):
+        other = Post.objects.create(author=self.alice, title='Other', content='...')
+        foreign = Comment.objects.create(post=other, author=self.alice, content='elsewhere')
+
+        response = self.client.post(self.url, {'content': 'hi', 'parent': foreign.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.data)
+
+    def test_post_and_parent_cannot_change_on_update(self):
+        root = self.comment('root')
+        other_root = self.comment('other root')
+        reply = self.comment('reply', parent=root)
+        other = Post.objects.create(author=self.alice, title='Other', content='...')
+
+        detail = reverse('comment-detail', args=[reply])
+        for change in ({'parent': other_root}, {'parent': reply}, {'post': other.id}):
+            response = self.client.patch(detail, {**change, 'content': 'edited'})
+            self.assertEqual(response.status_code, 200)
+
+        comment = Comment.objects.get(pk=reply)
+        self.assertEqual((comment.post_id, comment.parent_id, comment.content), (self.post.id, root, 'edited'))
+        response = self.client.get(self.url, {'thread': root})
+        self.assertEqual([c['content'] for c in response.data['results']], ['root', 'edited'])
+        self.post.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.post.comment_count, other.comment_count), (3, 0))
+
+    def test_comment_cannot_reply_to_itself_or_its_replies(self):
+        root = Comment.objects.get(pk=self.comment('root'))
+        reply = Comment.objects.get(pk=self.comment('reply', parent=root.id))
+        serializer = CommentSerializer(root)
+        for parent in (root, reply):
+            with self.assertRaises(ValidationError):
+                serializer.validate({'parent': parent})
+
+
+class TrendingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass') for i in range(3)]
+        self.posts = [
+            Post.objects.create(author=self.author, title=f'Post {i}', content='...')
+            for i in range(3)
+        ]
+
+    def like(self, fan, post):
+        self.client.force_authenticate(fan)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('like-post', args=[post.id]))
+
+    def trending_titles(self):
+        self.client.force_authenticate(self.author)
+        return [p['title'] for p in self.client.get(reverse('post-trending')).data]
+
+    def test_likes_and_comments_rank_posts(self):
+        self.trending_titles()  # load the cached top-K before it is updated
+        for fan in self.fans:
+            self.like(fan, self.posts[1])
+        self.like(self.fans[0], self.posts[2])
+
+        self.assertEqual(self.trending_titles(), ['Post 1', 'Post 2'])
+        with self.assertNumQueries(0):
+            trending.ranked()
+
+        self.client.force_authenticate(self.fans[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('unlike-post', args=[self.posts[2].id]))
+        self.posts[2].refresh_from_db()
+        self.assertEqual(self.posts[2].hot_score, 0)
+
+    def test_older_activity_decays(self):
+        now = timezone.now()
+        with self.settings(TRENDING_HALF_LIFE=3600):
+            trending.record(self.posts[0].id, 1.0, now - timedelta(hours=1))
+            trending.record(self.posts[1].id, 1.0, now)
+
+        self.posts[0].refresh_from_db()
+        self.posts[1].refresh_from_db()
+        self.assertAlmostEqual(self.posts[0].hot_score * 2, self.posts[1].hot_score)
+
+    def test_renormalize_and_rebuild_preserve_ranking(self):
+        for fan in self.fans[:2]:
+            self.like(fan, self.posts[0])
+        Comment.objects.create(post=self.posts[2], author=self.fans[0], content='!')
+
+        trending.renormalize(timezone.now() + timedelta(days=1))
+        self.assertEqual(self.trending_titles(), ['Post 0'])
+
+        call_command('rebuild_trending', stdout=StringIO())
+        # the comment was never scored live; the rebuild replays it
+        self.assertEqual(self.trending_titles(), ['Post 2', 'Post 0'])
+
+    def test_offer_waits_for_the_map_lock(self):
+        self.trending_titles()
+        cache.add(trending.LOCK_KEY, True)
+        with mock.patch.object(trending, 'LOCK_WAIT', 0):
+            trending.offer(self.posts[0].id, 5.0)
+        # A busy lock drops the map rather than overwrite another update.
+        self.assertIsNone(cache.get(trending.CACHE_KEY))
+
+        cache.delete(trending.LOCK_KEY)
+        self.trending_titles()
+        trending.offer(self.posts[1].id, 5.0)
+        self.assertEqual(cache.get(trending.CACHE_KEY)[1], {self.posts[1].id: 5.0})
+
+    def test_record_retries_after_a_concurrent_renormalization(self):
+        now = timezone.now()
+        epoch = trending.get_epoch(now)
+        # The epoch read before another request renormalized.
+        stale = epoch - timedelta(days=1)
+        with mock.patch.object(trending, 'get_epoch', side_effect=[stale, epoch]):
+            trending.record(self.posts[0].id, 1.0, now)
+        self.posts[0].refresh_from_db()
+        self.assertAlmostEqual(self.posts[0].hot_score, trending.boost(epoch, now, 1.0))
+
+        # Without a lock on the state row: the read, the update and the score.
+        with self.assertNumQueries(3):
+            trending.record(self.posts[0].id, 1.0, now)
+
+
+class MetricsTests(APITestCase):
+    @override_settings(METRICS_DB_SAMPLE_RATE=1.0)
+    def test_requests_are_exposed_in_prometheus_format(self):
+        user = User.objects.create_user(username='alice', password='pass')
+        Post.objects.create(author=user, title='Hello', content='World')
+        self.client.force_authenticate(user)
+        self.client.get(reverse('post-list'))
+
+        body = self.client.get('/metrics').content.decode()
+        labels = 'view="post-list",method="GET"'
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn(f'http_requests_total{{{labels},status="200"}}', body)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}', body)
+        # the ETag's COUNT and page, then the list's
+        self.assertRegex(body, rf'db_queries_per_request_bucket\{{{labels},le="5"\}} [1-9]')
+        self.assertIn(f'http_response_size_bytes_count{{{labels}}}', body)
+
+    def test_scrapes_are_limited_to_allowed_addresses_and_staff(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 403)
+        with self.settings(METRICS_ALLOWED_IPS=['203.0.113.5']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 200)
+
+        self.client.force_login(User.objects.create_user(username='ops', password='pass', is_staff=True))
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 200)
+
+    def test_shards_of_finished_threads_are_folded(self):
+        counter = metrics.Counter('test_total', 'Test.', ('view',))
+        threads = [threading.Thread(target=counter.inc, args=(('a',),)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        counter.inc(('a',))
+
+        self.assertEqual(counter.collect(), {('a',): [6]})
+        # only this thread's shard is still held
+        self.assertEqual(len(counter._shards), 1)
+        self.assertEqual(counter.collect(), {('a',): [6]})
+
+
+class SeedSocialTests(APITestCase):
+    def test_seeded_graph_is_consistent(self):
+        call_command('seed_social', users=40, posts=3, likes=3, comments=2, seed=7, chunk_size=50, stdout=StringIO())
+
+        self.assertEqual(User.objects.count(), 40)
+        for post in Post.objects.all():
+            self.assertEqual(post.like_count, post.likes.count())
+            self.assertEqual(post.comment_count, post.comments.count())
+        for comment in Comment.objects.exclude(parent=None).select_related('parent'):
+            self.assertTrue(comment.path.startswith(comment.parent.path + '/'))
+        user = User.objects.order_by('-following_count').first()
+        self.assertEqual(user.following_count, user.following.count())
+
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('feed'))
+        self.assertTrue(response.data['results'])
+        self.assertTrue(all(p['author'] != user.username for p in response.data['results']))
+
+
+class SQLiteConnectionTests(APITestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connections_are_tuned(self):
+        self.assertEqual(self.pragma('cache_size'), -20000)
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_wal_is_opt_in(self):
+        if settings.SQLITE_WAL:
+            self.skipTest('SQLITE_WAL is set')
+        self.assertNotIn('journal_mode', settings.DATABASES['default']['OPTIONS']['init_command'])
+        # Byte 18 of the file header is 1 in rollback-journal mode, 2 in WAL.
+        with open(settings.BASE_DIR / 'db.sqlite3', 'rb') as f:
+            self.assertEqual(f.read(20)[18], 1)
+
+
+class HotPathsBenchmarkTests(SimpleTestCase):
+    def test_small_run_completes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'run.json'
+            script = [sys.executable, str(settings.BASE_DIR / 'benchmarks' / 'hot_paths.py')]
+            subprocess.run(
+                script + ['--users', '5', '--requests', '60', '--warmup', '2', '--output', str(output)],
+                check=True, capture_output=True
+            )
+            results = json.loads(output.read_text())['results']
+            # five seeded users leave ten writers 50 distinct follows
+            self.assertEqual(results['follow_user']['requests'], 50)
+            self.assertEqual(results['feed']['requests'], 60)
+
+            subprocess.run(script + ['--compare', str(output), str(output)], check=True, capture_output=True)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(APITestCase):
+    def setUp(self):
+        # Pins have to be seen by every worker, so replicas need a shared cache.
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        shared = {**settings.CACHES, 'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+        }}
+        self.enterContext(override_settings(CACHES=shared))
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_alias(self, method='get', token='a', write=False):
+        def view(request):
+            if write:
+                self.router.db_for_write(Post)
+            return HttpResponse(self.router.db_for_read(Post))
+
+        request = getattr(self.factory, method)('/', HTTP_AUTHORIZATION=f'Token {token}')
+        return ReplicaStickinessMiddleware(view)(request).content.decode()
+
+    def test_reads_use_replica_until_client_writes(self):
+        self.assertEqual(self.read_alias(), 'replica')
+        self.assertEqual(self.read_alias('post'), 'default')
+        self.assertEqual(self.read_alias(write=True), 'default')
+
+        self.assertEqual(self.read_alias(), 'default')
+        self.assertEqual(self.read_alias(token='b'), 'replica')
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_credentials_are_read_from_the_primary(self):
+        def view(request):
+            return HttpResponse(f'{self.router.db_for_read(Token)} {self.router.db_for_read(Post)}')
+
+        # a client fresh from login, with nothing pinned yet
+        request = self.factory.get('/', HTTP_AUTHORIZATION='Token new')
+        self.assertEqual(ReplicaStickinessMiddleware(view)(request).content.decode(), 'default replica')
+
+    def test_process_local_cache_is_rejected(self):
+        local = {**settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=local), self.assertRaises(ImproperlyConfigured):
+            ReplicaStickinessMiddleware(HttpResponse)
+
+
+class ViewerStateTests(APITestCase):
+    def setUp(self):
+        self.me = User.objects.create_user(username='me', password='pass')
+        self.friend = User.objects.create_user(username='friend', password='pass')
+        self.stranger = User.objects.create_user(username='stranger', password='pass')
+        self.client.force_authenticate(self.me)
+        self.client.post(reverse('follow-user', args=[self.friend.pk]))
+        self.liked = Post.objects.create(author=self.friend, title='Liked', content='...')
+        self.other = Post.objects.create(author=self.stranger, title='Other', content='...')
+        timeline.fan_out_post(self.liked)
+        self.client.post(reverse('like-post', args=[self.liked.pk]))
+
+    def flags(self, results):
+        return {p['title']: (p['liked_by_me'], p['author_followed_by_me']) for p in results}
+
+    def test_list_and_feed_carry_flags_without_extra_queries(self):
+        # the ETag's COUNT and page, then COUNT and one SELECT with both flags
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(self.flags(response.data['results']), {'Liked': (True, True), 'Other': (False, False)})
+
+        response = self.client.get(reverse('feed'))
+        self.assertEqual(self.flags(response.data['results']), {'Liked': (True, True)})
+
+    def test_detail_and_trending(self):
+        response = self.client.get(reverse('post-detail', args=[self.liked.pk]))
+        self.assertTrue(response.data['liked_by_me'])
+        response = self.client.get(reverse('post-trending'))
+        self.assertEqual(self.flags(response.data)['Liked'], (True, True))
+
+    def test_following_the_author_changes_the_etag(self):
+        url = reverse('post-detail', args=[self.other.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('follow-user', args=[self.stranger.pk]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['author_followed_by_me'])
+
+        list_etag = self.client.get(reverse('post-list'))['ETag']
+        self.client.post(reverse('unfollow-user', args=[self.stranger.pk]))
+        self.assertNotEqual(self.client.get(reverse('post-list'))['ETag'], list_etag)
+
+    def test_swapping_followed_authors_changes_the_list_etag(self):
+        # One follow and one unfollow of authors with as many posts: the
+        # number of flagged rows is unchanged, the rows themselves are not.
+        url = reverse('post-list')
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('unfollow-user', args=[self.friend.pk]))
+        self.client.post(reverse('follow-user', args=[self.stranger.pk]))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.flags(response.data['results']), {'Liked': (True, False), 'Other': (False, True)})
+
+
+class IdempotencyTests(APITestCase):
+    def setUp(self):
+        caches['idempotency'].clear()
+        self.user = User.objects.create_user(username='retry', password='pass')
+        self.post = Post.objects.create(author=self.user, title='Hi', content='...')
+        self.client.force_authenticate(self.user)
+
+    def test_retried_like_is_replayed_without_queries(self):
+        url = reverse('like-post', args=[self.post.pk])
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='abc')
+        with self.assertNumQueries(0):
+            retry = self.client.post(url, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual((retry.status_code, retry.data), (first.status_code, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Like.objects.count(), 1)
+
+        # Without a key the duplicate still hits the unique check.
+        self.assertEqual(self.client.post(url).status_code, 400)
+
+    def test_create_is_replayed_and_key_reuse_is_rejected(self):
+        url = reverse('post-list')
+        body = {'title': 'Once', 'content': '...'}
+        first = self.client.post(url, body, HTTP_IDEMPOTENCY_KEY='k1')
+        retry = self.client.post(url, body, HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(Post.objects.filter(title='Once').count(), 1)
+
+        other = self.client.post(url, {'title': 'Other', 'content': '...'}, HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(other.status_code, 422)
+
+        comments = reverse('post-comments', args=[self.post.pk])
+        self.client.post(comments, {'content': 'Hey'}, HTTP_IDEMPOTENCY_KEY='k2')
+        self.client.post(comments, {'content': 'Hey'}, HTTP_IDEMPOTENCY_KEY='k2')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_concurrent_duplicate_waits_then_gives_up(self):
+        url = reverse('like-post', args=[self.post.pk])
+        # Another request holds the lock and never stores a response.
+        with mock.patch.object(caches['idempotency'], 'add', return_value=False), \
+                self.settings(IDEMPOTENCY_LOCK_WAIT=0.1):
+            response = self.client.post(url, HTTP_IDEMPOTENCY_KEY='busy')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Like.objects.exists())
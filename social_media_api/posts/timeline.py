@@ -0,0 +1,232 @@
+"""
+Fan-out-on-write timelines.
+
+When a post is created it is copied into the ``TimelineEntry`` inbox of
+every follower, so reading the feed is a range scan over the reader's own
+rows instead of a join over everyone they follow. Authors with more than
+``TIMELINE_FANOUT_MAX_FOLLOWERS`` followers are not fanned out; their posts
+are pulled in at read time instead so a single write stays bounded. When an
+unfollow takes such an author back under the limit, ``refill`` copies their
+recent posts into every follower's timeline, as a new follow would, since
+those posts stop being pulled.
+
+A feed page is built from two keyset range scans, each bounded by the page
+size: the reader's ``TimelineEntry`` rows on the (user, -created_at, -post)
+index, and the recent posts of the pulled authors on the (author,
+-created_at) index. The two sorted runs are merged in Python and the
+winning posts are loaded by primary key.
+"""
+import heapq
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Post, TimelineEntry
+from .viewer_state import with_viewer_state
+
+User = get_user_model()
+Follow = User.following.through
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def fanout_limit():
+    return _setting('TIMELINE_FANOUT_MAX_FOLLOWERS', 10000)
+
+
+def is_high_fanout(author):
+    """Authors at or above the limit are read with fan-out-on-read."""
+    return author.follower_count >= fanout_limit()
+
+
+def _entry(user_id, post):
+    return TimelineEntry(
+        user_id=user_id,
+        post_id=post.id,
+        author_id=post.author_id,
+        created_at=post.created_at,
+    )
+
+
+def _fan_out(author_id, posts):
+    """Write ``posts`` into the timeline of each of the author's followers."""
+    batch_size = _setting('TIMELINE_FANOUT_BATCH_SIZE', 1000)
+    follower_ids = (
+        Follow.objects.filter(to_user_id=author_id)
+        .values_list('from_user_id', flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+
+    written = 0
+    batch = []
+    for follower_id in follower_ids:
+        batch.extend(_entry(follower_id, post) for post in posts)
+        if len(batch) >= batch_size:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        written += len(batch)
+    return written
+
+
+def fan_out_post(post):
+    """Push a freshly created post into each follower's timeline."""
+    if is_high_fanout(post.author):
+        return 0
+    return _fan_out(post.author_id, [post])
+
+
+def refill(author_id):
+    """
+    Push an author's recent posts to all their followers if they are now
+    under the fan-out limit. Call it after an unfollow that may have taken
+    them under; it does nothing while they are still above.
+    """
+    author = User.objects.only('id', 'follower_count').get(pk=author_id)
+    if is_high_fanout(author):
+        return 0
+    size = _setting('TIMELINE_BACKFILL_SIZE', 100)
+    posts = list(
+        Post.objects.filter(author_id=author_id)
+        .only('id', 'author_id', 'created_at')
+        .order_by('-created_at', '-id')[:size]
+    )
+    return _fan_out(author_id, posts) if posts else 0
+
+
+def backfill(follower, author):
+    """Copy the author's most recent posts into a new follower's timeline."""
+    if is_high_fanout(author):
+        return 0
+
+    size = _setting('TIMELINE_BACKFILL_SIZE', 100)
+    posts = (
+        Post.objects.filter(author=author)
+        .only('id', 'author_id', 'created_at')
+        .order_by('-created_at', '-id')[:size]
+    )
+    entries = [_entry(follower.id, post) for post in posts]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def backfill_many(follower, authors):
+    """``backfill`` for several new follows: one ranked query, one insert."""
+    author_ids = [author.id for author in authors if not is_high_fanout(author)]
+    if not author_ids:
+        return 0
+
+    size = _setting('TIMELINE_BACKFILL_SIZE', 100)
+    recent = Window(
+        RowNumber(),
+        partition_by=[F('author_id')],
+        order_by=[F('created_at').desc(), F('id').desc()]
+    )
+    posts = (
+        Post.objects.filter(author_id__in=author_ids)
+        .annotate(rank=recent)
+        .filter(rank__lte=size)
+        .only('id', 'author_id', 'created_at')
+    )
+    entries = [_entry(follower.id, post) for post in posts]
+    TimelineEntry.objects.bulk_create(
+        entries,
+        ignore_conflicts=True,
+        batch_size=_setting('TIMELINE_FANOUT_BATCH_SIZE', 1000)
+    )
+    return len(entries)
+
+
+def prune(follower, author):
+    """Drop an unfollowed author's posts from the follower's timeline."""
+    deleted, _ = TimelineEntry.objects.filter(user=follower, author=author).delete()
+    return deleted
+
+
+def prune_many(follower, author_ids):
+    """``prune`` for several unfollowed authors in one DELETE."""
+    deleted, _ = TimelineEntry.objects.filter(user=follower, author_id__in=author_ids).delete()
+    return deleted
+
+
+def pulled_authors(user):
+    """Followed authors whose posts are merged in at read time."""
+    return user.following.filter(follower_count__gte=fanout_limit()).values('id')
+
+
+def _seek(created_field, id_field, position, newer):
+    """Rows strictly older than ``position`` (newer, if ``newer``)."""
+    created_at, pk = position
+    op = 'gt' if newer else 'lt'
+    return (
+        Q(**{f'{created_field}__{op}': created_at})
+        | Q(**{created_field: created_at, f'{id_field}__{op}': pk})
+    )
+
+
+def _feed_keys(user, position, newer, limit):
+    """
+    The two sorted runs of ``(created_at, post_id)`` keys to merge: pushed
+    timeline entries and posts by pulled authors, newest first (oldest
+    first if ``newer``).
+    """
+    direction = '' if newer else '-'
+    pushed = TimelineEntry.objects.filter(user=user)
+    pulled = Post.objects.filter(author_id__in=pulled_authors(user))
+    if position is not None:
+        pushed = pushed.filter(_seek('created_at', 'post_id', position, newer))
+        pulled = pulled.filter(_seek('created_at', 'id', position, newer))
+    pushed = pushed.order_by(f'{direction}created_at', f'{direction}post_id').values_list('created_at', 'post_id')
+    pulled = pulled.order_by(f'{direction}created_at', f'{direction}id').values_list('created_at', 'id')
+    return pushed[:limit], pulled[:limit]
+
+
+def _merge(pushed, pulled, newer, limit):
+    ids = []
+    for _, post_id in heapq.merge(pushed, pulled, reverse=not newer):
+        # A post can be in both runs if its author crossed the fan-out limit.
+        if not ids or ids[-1] != post_id:
+            ids.append(post_id)
+        if len(ids) == limit:
+            break
+    return ids
+
+
+def _feed_posts(user, ids):
+    return with_viewer_state(Post.objects.filter(id__in=ids).select_related('author'), user)
+
+
+def _in_order(rows, ids):
+    by_id = {row['id']: row for row in rows}
+    return [by_id[post_id] for post_id in ids if post_id in by_id]
+
+
+def feed_rows(user, position=None, newer=False, limit=20, project=None):
+    """
+    Up to ``limit`` feed posts strictly older than the ``(created_at, id)``
+    ``position``, newest first; with ``newer``, the ones just newer than it,
+    oldest first. Rows are ``project(queryset)`` values with the viewer
+    flags, e.g. ``FlatPostSerializer.project``.
+    """
+    pushed, pulled = _feed_keys(user, position, newer, limit)
+    ids = _merge(list(pushed), list(pulled), newer, limit)
+    if not ids:
+        return []
+    return _in_order(project(_feed_posts(user, ids)), ids)
+
+
+async def afeed_rows(user, position=None, newer=False, limit=20, project=None):
+    """Async ``feed_rows``, for views running on the event loop."""
+    pushed, pulled = _feed_keys(user, position, newer, limit)
+    pushed = [key async for key in pushed]
+    pulled = [key async for key in pulled]
+    ids = _merge(pushed, pulled, newer, limit)
+    if not ids:
+        return []
+    return _in_order([row async for row in project(_feed_posts(user, ids))], ids)
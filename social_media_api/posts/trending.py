@@ -0,0 +1,221 @@
+"""
+Incrementally maintained trending scores.
+
+Every like or comment adds ``weight * 2 ** ((t - epoch) / half_life)`` to
+``Post.hot_score``. This is exponential decay written forwards: instead of
+shrinking every old score as time passes, newer events are worth
+exponentially more, so ordering by ``hot_score`` ranks posts by their
+decayed activity right now and a single event only touches its own row.
+Unlikes and deleted comments subtract the same boost they once added.
+
+Boosts grow as the present moves away from the epoch, so once the epoch is
+``TRENDING_RENORMALIZE_AFTER`` seconds old it is moved to the present and
+all scores are scaled down by the same factor in one UPDATE.
+
+The top ``TRENDING_SIZE`` posts are kept in the cache as a bounded post id
+-> score map that each update offers its new score to, so trending requests
+are answered in O(K) without touching the ``hot_score`` index. The map is
+approximate between refreshes -- a post that cools down is not replaced by
+one outside it -- and is reloaded from the index every ``TRENDING_REFRESH``
+seconds or after a renormalization.
+
+Updates to the cached map take a short cache lock (``cache.add``), so
+concurrent offers do not overwrite each other. An offer that cannot get the
+lock drops the map instead, and the next read reloads it. Only
+renormalization locks the ``TrendingState`` row. Scoring an event reads the
+epoch without a lock and applies its boost only while that epoch is still
+current, retrying once against the new epoch if a renormalization got in
+between.
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Comment, Like, Post, TrendingState
+
+CACHE_KEY = 'posts:trending'
+LOCK_KEY = 'posts:trending:lock'
+# Seconds an offer waits for the lock, and after which a lock left behind by
+# a crashed process expires.
+LOCK_WAIT = 0.05
+LOCK_TIMEOUT = 5
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def like_weight():
+    return _setting('TRENDING_LIKE_WEIGHT', 1.0)
+
+
+def comment_weight():
+    return _setting('TRENDING_COMMENT_WEIGHT', 2.0)
+
+
+def size():
+    return _setting('TRENDING_SIZE', 100)
+
+
+def boost(epoch, when, weight):
+    half_life = _setting('TRENDING_HALF_LIFE', 6 * 3600)
+    return weight * 2 ** ((when - epoch).total_seconds() / half_life)
+
+
+def get_epoch(now=None):
+    state, _ = TrendingState.objects.get_or_create(pk=1, defaults={'epoch': now or timezone.now()})
+    return state.epoch
+
+
+def _locked_state(now):
+    """The trending state row, locked until the transaction ends."""
+    try:
+        return TrendingState.objects.select_for_update().get(pk=1)
+    except TrendingState.DoesNotExist:
+        TrendingState.objects.get_or_create(pk=1, defaults={'epoch': now})
+        return TrendingState.objects.select_for_update().get(pk=1)
+
+
+@transaction.atomic
+def renormalize(now=None):
+    """Move the epoch to ``now`` and rescale every score to match."""
+    now = now or timezone.now()
+    state = _locked_state(now)
+    factor = boost(now, state.epoch, 1.0)
+    Post.objects.filter(hot_score__gt=0).update(hot_score=F('hot_score') * factor)
+    state.epoch = now
+    state.save(update_fields=['epoch'])
+    transaction.on_commit(partial(cache.delete, CACHE_KEY))
+    return now
+
+
+def record(post_id, weight, when=None):
+    """
+    Add an event of ``weight`` that happened at ``when`` to a post's score.
+
+    A negative weight together with the original ``when`` retracts it.
+    """
+    now = timezone.now()
+    epoch = get_epoch(now)
+    if (now - epoch).total_seconds() > _setting('TRENDING_RENORMALIZE_AFTER', 7 * 24 * 3600):
+        epoch = renormalize(now)
+
+    if not _add(post_id, epoch, boost(epoch, when or now, weight)):
+        # Either the post is gone or a renormalization moved the epoch
+        # after it was read; in the latter case score against the new one.
+        latest = get_epoch(now)
+        if latest == epoch or not _add(post_id, latest, boost(latest, when or now, weight)):
+            return
+    score = Post.objects.filter(pk=post_id).values_list('hot_score', flat=True).first()
+    if score is not None:
+        transaction.on_commit(partial(offer, post_id, score))
+
+
+def _add(post_id, epoch, amount):
+    """Add ``amount`` to a post's score if ``epoch`` is still the current one."""
+    current = TrendingState.objects.filter(pk=1, epoch=epoch)
+    # Rounding can leave a retracted score a hair below zero.
+    return Post.objects.filter(Exists(current), pk=post_id).update(
+        hot_score=Greatest(F('hot_score') + amount, Value(0.0))
+    )
+
+
+@contextmanager
+def _map_lock():
+    """Hold the cache lock on the top-K map; yields False if it stays busy."""
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.005)
+    try:
+        yield True
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _load():
+    rows = (
+        Post.objects.filter(hot_score__gt=0)
+        .order_by('-hot_score')
+        .values_list('id', 'hot_score')[:size()]
+    )
+    top = dict(rows)
+    with _map_lock() as locked:
+        # If an offer holds the lock, serve this result without caching it.
+        if locked:
+            _store(time.time() + _setting('TRENDING_REFRESH', 300), top)
+    return top
+
+
+def _store(expires, top):
+    cache.set(CACHE_KEY, (expires, top), max(1, expires - time.time()))
+
+
+def offer(post_id, score):
+    """Update the cached top-K with a post's new score."""
+    with _map_lock() as locked:
+        if not locked:
+            # Better no map than one missing this update.
+            cache.delete(CACHE_KEY)
+            return
+        entry = cache.get(CACHE_KEY)
+        if entry is None:
+            # Nothing to update; the next read loads from the index.
+            return
+        expires, top = entry
+        if post_id in top or len(top) < size():
+            top[post_id] = score
+        else:
+            lowest = min(top, key=top.get)
+            if score <= top[lowest]:
+                return
+            del top[lowest]
+            top[post_id] = score
+        _store(expires, top)
+
+
+def ranked(limit=None):
+    """Ids of the hottest posts, best first."""
+    entry = cache.get(CACHE_KEY)
+    top = entry[1] if entry is not None else _load()
+    ids = sorted(top, key=top.get, reverse=True)
+    return ids[:limit] if limit else ids
+
+
+def rebuild(now=None):
+    """
+    Recompute every score from likes and comments in the last
+    ``TRENDING_HISTORY`` seconds, against a fresh epoch.
+
+    Returns the number of posts with a non-zero score.
+    """
+    now = now or timezone.now()
+    since = now - timedelta(seconds=_setting('TRENDING_HISTORY', 7 * 24 * 3600))
+
+    scores = defaultdict(float)
+    for model, weight in ((Like, like_weight()), (Comment, comment_weight())):
+        events = model.objects.filter(created_at__gte=since).values_list('post_id', 'created_at')
+        for post_id, created_at in events.iterator(chunk_size=2000):
+            scores[post_id] += boost(now, created_at, weight)
+
+    with transaction.atomic():
+        TrendingState.objects.update_or_create(pk=1, defaults={'epoch': now})
+        Post.objects.filter(hot_score__gt=0).update(hot_score=0)
+        Post.objects.bulk_update(
+            [Post(pk=post_id, hot_score=score) for post_id, score in scores.items()],
+            ['hot_score'],
+            batch_size=1000
+        )
+    cache.delete(CACHE_KEY)
+    return len(scores)
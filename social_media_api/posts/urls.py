@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     PostViewSet,
     CommentViewSet,
     feed,
+    post_comments,
     like_post,
     unlike_post,
 )
@@ -16,7 +18,13 @@ urlpatterns = [
     path('', include(router.urls)),
     path('feed/', feed, name='feed'),
 
+    # ✅ Comments on a post
+    path('posts/<int:pk>/comments/', post_comments, name='post-comments'),
+
     # ✅ Likes
     path('posts/<int:pk>/like/', like_post, name='like-post'),
     path('posts/<int:pk>/unlike/', unlike_post, name='unlike-post'),
+
+    # ✅ Async (ASGI) reads
+    path('async/feed/', async_views.feed, name='async-feed'),
 ]
\ No newline at end of file
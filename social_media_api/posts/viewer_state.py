@@ -0,0 +1,29 @@
+"""
+Per-viewer flags on post lists.
+
+``liked_by_me`` and ``author_followed_by_me`` are added to a post queryset
+as two correlated ``EXISTS`` subqueries, so a page of posts still comes
+back in one query however many rows it has. Both lookups are covered by
+the unique (user, post) and (from_user, to_user) indexes.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, Value
+
+from .models import Like
+
+User = get_user_model()
+Follow = User.following.through
+
+FLAGS = ('liked_by_me', 'author_followed_by_me')
+
+
+def with_viewer_state(queryset, user):
+    """Annotate ``queryset`` of posts with the viewer flags for ``user``."""
+    if not user.is_authenticated:
+        return queryset.annotate(**{flag: Value(False) for flag in FLAGS})
+    return queryset.annotate(
+        liked_by_me=Exists(Like.objects.filter(user_id=user.pk, post_id=OuterRef('pk'))),
+        author_followed_by_me=Exists(
+            Follow.objects.filter(from_user_id=user.pk, to_user_id=OuterRef('author_id'))
+        ),
+    )
@@ -1,69 +1,185 @@
 from rest_framework import generics
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions
 from .models import Post, Comment, Like
-from .serializers import PostSerializer, CommentSerializer
+from .serializers import PostSerializer, CommentSerializer, FlatPostSerializer, PostCommentSerializer
 from .permissions import IsOwnerOrReadOnly
+from .pagination import CommentPagination, FeedPagination, ThreadPagination
+from .filters import FullTextSearchFilter
+from .conditional import ConditionalGetMixin
+from . import timeline, trending
+from .viewer_state import FLAGS, with_viewer_state
 from django.shortcuts import get_object_or_404
-from django.contrib.contenttypes.models import ContentType
-from notifications.models import Notification
-
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by('-created_at')
+from django.db import transaction
+from django.db.models import F
+from django.utils.decorators import method_decorator
+from notifications import outbox
+from social_media_api.idempotency import idempotent
+
+class FlatListMixin:
+    """Serve list pages through ``flat_serializer_class`` when possible."""
+    flat_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.flat_serializer_class is None or not hasattr(queryset, 'values'):
+            return super().list(request, *args, **kwargs)
+
+        rows = self.flat_serializer_class.project(queryset)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(self.flat_serializer_class(rows).data)
+        return self.get_paginated_response(self.flat_serializer_class(page).data)
+
+
+class PostViewSet(ConditionalGetMixin, FlatListMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.select_related('author').order_by('-created_at')
     serializer_class = PostSerializer
+    flat_serializer_class = FlatPostSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    etag_fields = ('updated_at', 'like_count', 'comment_count')
+    etag_flags = FLAGS
 
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'content']
+    filter_backends = [FullTextSearchFilter]
 
-    def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+    def get_queryset(self):
+        return with_viewer_state(super().get_queryset(), self.request.user)
 
+    @method_decorator(idempotent)
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all().order_by('-created_at')
+    def perform_create(self, serializer):
+        post = serializer.save(author=self.request.user)
+        timeline.fan_out_post(post)
+
+    @action(detail=False)
+    def trending(self, request):
+        """Hottest posts by time-decayed likes and comments, see posts.trending."""
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 20
+        ids = trending.ranked(max(1, min(limit, trending.size())))
+        posts = with_viewer_state(Post.objects.select_related('author'), request.user).in_bulk(ids)
+        ranked = [posts[post_id] for post_id in ids if post_id in posts]
+        return Response(PostSerializer(ranked, many=True).data)
+
+
+@transaction.atomic
+def create_comment(serializer, **kwargs):
+    comment = serializer.save(**kwargs)
+    Post.objects.filter(pk=comment.post_id).update(
+        comment_count=F('comment_count') + 1
+    )
+    trending.record(comment.post_id, trending.comment_weight(), comment.created_at)
+    return comment
+
+
+class CommentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.select_related('author').order_by('-created_at')
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
 
+    @method_decorator(idempotent)
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        create_comment(serializer, author=self.request.user)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        post_id = instance.post_id
+        # Replies are deleted along with the comment.
+        removed = list(
+            Comment.objects.filter(post_id=post_id, **Comment.subtree(instance.path))
+            .values_list('created_at', flat=True)
+        )
+        instance.delete()
+        Post.objects.filter(pk=post_id).update(
+            comment_count=F('comment_count') - len(removed)
+        )
+        for created_at in removed:
+            trending.record(post_id, -trending.comment_weight(), created_at)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def feed(request):
-    following_users = request.user.following.all()
+    paginator = FeedPagination()
+    page = paginator.paginate_feed(request.user, request, FlatPostSerializer.project)
+    serializer = FlatPostSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
-    posts = Post.objects.filter(author__in=following_users).order_by('-created_at')
 
-    serializer = PostSerializer(posts, many=True)
-    return Response(serializer.data)
 
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def post_comments(request, pk):
+    """
+    Comments on one post.
+
+    GET lists top-level comments oldest first, ``?parent=<id>`` the direct
+    replies to a comment, and ``?thread=<id>`` a comment's whole subtree in
+    depth-first order. Each page is one indexed, keyset-paginated query.
+    POST adds a comment, optionally replying to ``parent``.
+    """
+    post = generics.get_object_or_404(Post, pk=pk)
+
+    if request.method == 'POST':
+        serializer = PostCommentSerializer(data=request.data, context={'request': request, 'post': post})
+        serializer.is_valid(raise_exception=True)
+        create_comment(serializer, author=request.user, post=post)
+        return Response(serializer.data, status=201)
+
+    comments = Comment.objects.filter(post=post).select_related('author')
+    thread = request.query_params.get('thread')
+    parent = request.query_params.get('parent')
+    if thread:
+        root = generics.get_object_or_404(Comment.objects.only('path'), pk=thread, post=post)
+        comments = comments.filter(**Comment.subtree(root.path))
+        paginator = ThreadPagination()
+    elif parent:
+        parent = generics.get_object_or_404(Comment.objects.only('id'), pk=parent, post=post)
+        comments = comments.filter(parent=parent)
+        paginator = CommentPagination()
+    else:
+        comments = comments.filter(parent__isnull=True)
+        paginator = CommentPagination()
+
+    page = paginator.paginate_queryset(comments, request)
+    serializer = PostCommentSerializer(page, many=True, context={'request': request, 'post': post})
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def like_post(request, pk):
     post = generics.get_object_or_404(Post, pk=pk)
 
-    # ✅ Prevent duplicate likes
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
-
-    if not created:
-        return Response({'detail': 'Post already liked'}, status=400)
-
-    # ✅ Create notification
-    if post.author != request.user:
-        Notification.objects.create(
-            recipient=post.author,
-            actor=request.user,
-            verb='liked your post',
-            target=post,
-            target_content_type=ContentType.objects.get_for_model(post),
-            target_object_id=post.id
-        )
+    with transaction.atomic():
+        # ✅ Prevent duplicate likes
+        like, created = Like.objects.get_or_create(user=request.user, post=post)
+
+        if not created:
+            return Response({'detail': 'Post already liked'}, status=400)
+
+        Post.objects.filter(pk=post.pk).update(like_count=F('like_count') + 1)
+        trending.record(post.pk, trending.like_weight(), like.created_at)
+
+        # ✅ Queue notification; process_notifications delivers it
+        if post.author_id != request.user.id:
+            outbox.enqueue(
+                recipient_id=post.author_id,
+                actor_id=request.user.id,
+                verb='liked your post',
+                target=post
+            )
 
     return Response({'message': 'Post liked'})
 
@@ -73,9 +189,12 @@ def like_post(request, pk):
 def unlike_post(request, pk):
     post = generics.get_object_or_404(Post, pk=pk)
 
-    like = Like.objects.filter(user=request.user, post=post)
-    if not like.exists():
-        return Response({'detail': 'Post not liked'}, status=400)
+    with transaction.atomic():
+        like = Like.objects.filter(user=request.user, post=post).first()
+        if like is None:
+            return Response({'detail': 'Post not liked'}, status=400)
 
-    like.delete()
+        like.delete()
+        Post.objects.filter(pk=post.pk).update(like_count=F('like_count') - 1)
+        trending.record(post.pk, -trending.like_weight(), like.created_at)
     return Response({'message': 'Post unliked'})
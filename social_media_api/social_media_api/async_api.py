@@ -0,0 +1,79 @@
+"""
+Helpers for the native async (ASGI) read endpoints.
+
+DRF's ``@api_view`` runs synchronously, so under ``asgi.py`` every call
+holds a worker thread while it waits on the database. The views built
+with ``async_api_view`` run on the event loop instead: queries use the
+async ORM and only serialization and rendering are handed to a thread.
+They give the best results behind an ASGI server such as uvicorn or
+daphne, but also work under WSGI.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from accounts.authentication import CachedTokenAuthentication
+
+from .renderers import FastJSONRenderer
+
+_authenticator = CachedTokenAuthentication()
+
+
+def _error(exc):
+    return json_response({'detail': exc.detail}, exc.status_code)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    """Render small payloads inline; use ``render`` for serializer output."""
+    return HttpResponse(
+        FastJSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json',
+    )
+
+
+def async_api_view(view):
+    """
+    Authenticated, read-only async view.
+
+    The wrapped coroutine receives a DRF ``Request`` (for ``query_params``
+    and serializer context) with ``request.user`` already set.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return _error(exceptions.MethodNotAllowed(request.method))
+        try:
+            result = await _authenticator.aauthenticate(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+            drf_request = Request(request, authenticators=())
+            drf_request.user, drf_request.auth = result
+            return await view(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return _error(exc)
+
+    return wrapper
+
+
+def _serialize_and_render(serializer_class, instance, context, many, wrap):
+    data = serializer_class(instance, many=many, context=context).data
+    if wrap is not None:
+        data = wrap(data)
+    return json_response(data)
+
+
+async def render(serializer_class, instance, request, many=False, wrap=None):
+    """Serialize and render in a worker thread, off the event loop."""
+    return await sync_to_async(_serialize_and_render)(
+        serializer_class, instance, {'request': request}, many, wrap
+    )
+
+
+async def render_page(paginator, serializer_class, page, request):
+    def wrap(data):
+        return paginator.get_paginated_response(data).data
+    return await render(serializer_class, page, request, many=True, wrap=wrap)
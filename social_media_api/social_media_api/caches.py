@@ -0,0 +1,17 @@
+"""
+Whether a cache is visible to every process.
+
+Counters and locks kept in the cache are only correct when all web workers
+and background commands read the same store. The local-memory and dummy
+backends are private to one process (or store nothing), so code that needs
+sharing checks ``is_shared`` and falls back to the database otherwise.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_shared(alias='default'):
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
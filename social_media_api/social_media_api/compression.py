@@ -0,0 +1,123 @@
+"""
+Response compression negotiated through ``Accept-Encoding``.
+
+Like Django's GZipMiddleware, but it also speaks brotli when the
+``brotli`` package is installed, honours q-values, and compresses
+streaming responses (sync and async) chunk by chunk.
+"""
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_accept_re = _lazy_re_compile(r'\s*([^\s;,]+)\s*(?:;\s*q=([0-9.]+))?')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def accepted_encodings(header):
+    """Map of encoding -> q-value from an Accept-Encoding header."""
+    accepted = {}
+    for part in header.split(','):
+        match = _accept_re.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        accepted[match.group(1).lower()] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best, best_quality = None, 0
+    for encoding in candidates:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self._obj = brotli.Compressor(quality=_setting('COMPRESSION_BROTLI_QUALITY', 4))
+            self._compress = self._obj.process
+        else:
+            self._obj = zlib.compressobj(_setting('COMPRESSION_GZIP_LEVEL', 6), zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = self._obj.compress
+        self.encoding = encoding
+
+    def compress(self, data):
+        return self._compress(data)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def _compress_stream(chunks, encoding):
+    compressor = _Compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def _acompress_stream(chunks, encoding):
+    compressor = _Compressor(encoding)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < _setting('COMPRESSION_MIN_LENGTH', 200):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = _compress_stream(response.streaming_content, encoding)
+            del response.headers['Content-Length']
+        else:
+            compressor = _Compressor(encoding)
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The body changed, so a strong ETag no longer matches it byte for byte.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,108 @@
+"""
+``Idempotency-Key`` support for write endpoints.
+
+A client that may retry a POST sends a unique ``Idempotency-Key`` header.
+The first request with a given key runs the view. Its response is then
+stored in the ``IDEMPOTENCY_CACHE`` cache for ``IDEMPOTENCY_TTL`` seconds,
+keyed by the user and the idempotency key. A retry with the same key is
+answered from the cache, without touching the database, and is marked
+with an ``Idempotent-Replayed: true`` header.
+
+Each stored response carries a fingerprint of the method, path and body.
+Reusing a key for a different request is rejected with 422.
+
+Concurrent requests with the same key are collapsed. The first takes a
+short lock with ``cache.add``. The others poll for its response for up to
+``IDEMPOTENCY_LOCK_WAIT`` seconds, then give up with 409. 5xx responses
+and errors raised by the view (validation errors, 404s) are not stored,
+so a retry runs the view again.
+
+Use a cache shared by all workers (Redis, Memcached) in production. With
+the per-process local-memory cache, a retry that reaches another worker
+is not recognised.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[_setting('IDEMPOTENCY_CACHE', 'default')]
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.get_full_path().encode(), request.body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {'detail': f'{HEADER} was already used for a different request.'},
+            status=422
+        )
+    return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view):
+    """
+    Make a DRF view function honour ``Idempotency-Key`` on unsafe methods.
+
+    Apply it below ``@api_view`` so ``request.user`` is authenticated, or
+    with ``method_decorator`` on a viewset action.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'detail': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'}, status=400)
+
+        cache = _cache()
+        scope = hashlib.sha256(f'{request.user.pk}:{key}'.encode()).hexdigest()
+        response_key, lock_key = f'idempotency:{scope}', f'idempotency:{scope}:lock'
+        fingerprint = _fingerprint(request)
+
+        stored = cache.get(response_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        if not cache.add(lock_key, True, _setting('IDEMPOTENCY_LOCK_TIMEOUT', 30)):
+            # Another request with this key is running; wait for its response.
+            deadline = time.monotonic() + _setting('IDEMPOTENCY_LOCK_WAIT', 5)
+            while time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                stored = cache.get(response_key)
+                if stored is not None:
+                    return _replay(stored, fingerprint)
+            return Response({'detail': f'A request with this {HEADER} is in progress.'}, status=409)
+
+        try:
+            response = view(request, *args, **kwargs)
+            if response.status_code < 500 and hasattr(response, 'data'):
+                cache.set(
+                    response_key,
+                    {'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data},
+                    _setting('IDEMPOTENCY_TTL', 24 * 60 * 60)
+                )
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
@@ -0,0 +1,266 @@
+"""
+Per-view request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` records, per resolved view name and method:
+
+* request latency and response size histograms, for every request;
+* the number of database queries and the time spent in them, measured
+  with ``connection.execute_wrapper`` on a ``METRICS_DB_SAMPLE_RATE``
+  fraction of requests.
+
+Histograms use fixed, preallocated bucket arrays. Each thread writes to its
+own shard, so recording never takes a lock; ``render()`` sums the shards
+when ``/metrics`` is scraped. Shards of threads that have exited are folded
+into one retired total at that point, so memory does not grow with thread
+churn. Every process reports its own totals.
+
+``/metrics`` is served to staff users and to the addresses listed in
+``METRICS_ALLOWED_IPS`` (loopback by default); everyone else gets 403.
+
+The module only depends on Django. It lives in this project's package;
+another project has to copy it into its own package before adding the
+middleware and ``metrics_view`` to its settings and URLconf. It should come
+first in ``MIDDLEWARE`` so latency covers the whole stack.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def new_slot(self):
+        raise NotImplementedError
+
+    def slot(self, label_values):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            # Once per thread; everything after this is lock-free.
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        slot = shard.get(label_values)
+        if slot is None:
+            slot = shard[label_values] = self.new_slot()
+        return slot
+
+    @staticmethod
+    def _add(totals, shard):
+        for label_values, slot in list(shard.items()):
+            total = totals.setdefault(label_values, [0] * len(slot))
+            for i, value in enumerate(slot):
+                total[i] += value
+
+    def collect(self):
+        """Totals per label values, summed over all threads."""
+        with self._lock:
+            # A thread that has exited writes no more, so its shard can be
+            # merged into the retired totals and dropped.
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._add(self._retired, shard)
+            self._shards = live
+            totals = {label_values: list(total) for label_values, total in self._retired.items()}
+        for _, shard in live:
+            self._add(totals, shard)
+        return totals
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for label_values, total in sorted(self.collect().items()):
+            lines.extend(self.render_slot(list(zip(self.labels, label_values)), total))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def new_slot(self):
+        return [0]
+
+    def inc(self, label_values, amount=1):
+        self.slot(label_values)[0] += amount
+
+    def render_slot(self, pairs, total):
+        yield f'{self.name}{_format_labels(pairs)} {_format_number(total[0])}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def new_slot(self):
+        # One count per bucket, one for +Inf, then the sum.
+        return [0] * (len(self.buckets) + 2)
+
+    def observe(self, label_values, value):
+        slot = self.slot(label_values)
+        slot[bisect_left(self.buckets, value)] += 1
+        slot[-1] += value
+
+    def render_slot(self, pairs, total):
+        cumulative = 0
+        bounds = [_format_number(bound) for bound in self.buckets] + ['+Inf']
+        for bound, count in zip(bounds, total[:-1]):
+            cumulative += count
+            yield f'{self.name}_bucket{_format_labels(pairs + [("le", bound)])} {cumulative}'
+        yield f'{self.name}_sum{_format_labels(pairs)} {_format_number(total[-1])}'
+        yield f'{self.name}_count{_format_labels(pairs)} {cumulative}'
+
+
+LABELS = ('view', 'method')
+
+requests_total = Counter(
+    'http_requests_total', 'Requests by view, method and status.', LABELS + ('status',)
+)
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time spent handling the request.', LATENCY_BUCKETS, LABELS
+)
+response_size = Histogram(
+    'http_response_size_bytes', 'Size of non-streaming response bodies.', SIZE_BUCKETS, LABELS
+)
+db_queries = Histogram(
+    'db_queries_per_request', 'Database queries per sampled request.', QUERY_COUNT_BUCKETS, LABELS
+)
+db_duration = Histogram(
+    'db_query_duration_seconds', 'Time spent in the database per sampled request.', LATENCY_BUCKETS, LABELS
+)
+
+REGISTRY = [requests_total, request_duration, response_size, db_queries, db_duration]
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    user = getattr(request, 'user', None)
+    allowed = request.META.get('REMOTE_ADDR') in _setting('METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if not (allowed or (user is not None and user.is_staff)):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class QueryTracker:
+    """``execute_wrapper`` that counts queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Unresolved paths share one label so 404 scans can't blow up cardinality.
+        return '<unmatched>'
+    return match.view_name or match.route
+
+
+def _record(request, response, elapsed, tracker=None):
+    labels = (_view_name(request), request.method)
+    requests_total.inc(labels + (str(response.status_code),))
+    request_duration.observe(labels, elapsed)
+    if not response.streaming:
+        response_size.observe(labels, len(response.content))
+    if tracker is not None:
+        db_queries.observe(labels, tracker.count)
+        db_duration.observe(labels, tracker.duration)
+
+
+class MetricsMiddleware:
+    """
+    Records the metrics above for every request.
+
+    Database queries are only seen on the thread handling the request, so
+    async views report latency and size but no database figures.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        tracker = None
+        start = time.perf_counter()
+        if random.random() < _setting('METRICS_DB_SAMPLE_RATE', 0.1):
+            tracker = QueryTracker()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(tracker))
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        _record(request, response, time.perf_counter() - start, tracker)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        _record(request, response, time.perf_counter() - start)
+        return response
@@ -0,0 +1,163 @@
+"""
+Keyset (seek) pagination shared by the list endpoints.
+
+Pages are addressed by an opaque cursor holding the ordering values of the
+last row seen, so fetching page N costs the same indexed range scan as
+page one instead of an ever-growing OFFSET.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Must end in a unique field so every row has a distinct position.
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 100)
+    cursor_query_param = 'cursor'
+    since_query_param = 'since'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None, chunk_size=100):
+        """Async variant for views running on the event loop."""
+        page = self.page_queryset(queryset, request)
+        return self.finish_page([row async for row in page.aiterator(chunk_size=chunk_size)])
+
+    def start_page(self, request, model):
+        """
+        Read the page size and cursors. Returns the position to seek from:
+        ``since`` when refreshing, else ``cursor`` (``None`` on page one).
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = model
+
+        since = self.decode_cursor(request.query_params.get(self.since_query_param))
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+
+        self.refreshing = since is not None
+        return since if self.refreshing else cursor
+
+    def page_queryset(self, queryset, request):
+        """The sliced queryset for the requested page, not yet evaluated."""
+        position = self.start_page(request, queryset.model)
+        if self.refreshing:
+            # Pull-to-refresh: the rows just newer than `since`, oldest first,
+            # flipped back into list order so the client can keep pulling.
+            queryset = queryset.filter(self.seek(position, reverse=True))
+            return queryset.order_by(*self.reversed_ordering())[:self.page_size]
+
+        if position is not None:
+            queryset = queryset.filter(self.seek(position))
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def finish_page(self, rows):
+        if self.refreshing:
+            rows.reverse()
+            self.has_next = False
+        else:
+            self.has_next = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+
+        self.rows = rows
+        return rows
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.since_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.rows[-1]))
+
+    def get_previous_link(self):
+        # Points at anything newer than the top of this page.
+        if self.rows:
+            since = self.encode_cursor(self.rows[0])
+        else:
+            since = self.request.query_params.get(self.since_query_param)
+            if not since:
+                return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.since_query_param, since)
+
+    def field_names(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def seek(self, values, reverse=False):
+        """Rows strictly after ``values`` in ordering (before, if reverse)."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith('-') != reverse
+            field = name.lstrip('-')
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def row_value(self, row, field):
+        if isinstance(row, dict):
+            return row[field]
+        return getattr(row, field)
+
+    def encode_cursor(self, row):
+        values = []
+        for field in self.field_names():
+            value = self.row_value(row, field)
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            names = self.field_names()
+            if not isinstance(values, list) or len(values) != len(names):
+                raise ValueError
+            return [
+                self.model._meta.get_field(name).to_python(value)
+                for name, value in zip(names, values)
+            ]
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,56 @@
+"""
+Faster JSON rendering and parsing for DRF.
+
+``orjson`` is used when it is installed; otherwise both classes behave
+exactly like DRF's ``JSONRenderer`` / ``JSONParser``. Anything orjson does
+not handle natively (datetimes, Decimals, lazy strings, ...) is passed to
+DRF's own encoder. U+2028 and U+2029, which orjson writes raw, are escaped
+as DRF does, so the output stays safe to embed in JavaScript. Floats may
+still be spelled differently (``1e16`` vs ``1e+16``); the values are the
+same.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        # Pretty-printing (the browsable API, ?indent=) is rare; let DRF do it.
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+        # Line and paragraph separators are valid JSON but not valid JavaScript.
+        if LINE_SEPARATOR in ret or PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8').lower()
+        if orjson is None or encoding.replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
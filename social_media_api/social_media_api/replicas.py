@@ -0,0 +1,157 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+``ReplicaRouter`` sends reads to one of the ``DATABASE_REPLICAS`` aliases
+and every write to ``default``. Only requests let through by
+``ReplicaStickinessMiddleware`` read from a replica; management commands,
+workers and shells always use the primary.
+
+Within a request, any write pins the rest of the request to the primary.
+It also pins the client for ``DATABASE_REPLICA_PIN_SECONDS`` afterwards,
+so a user who has just liked or posted something reads it back even if
+the replicas lag. Unsafe methods (POST, PUT, PATCH, DELETE) are served
+from the primary throughout. Clients are identified by their
+Authorization header or session cookie, hashed, in the shared cache.
+
+The pin must be visible to every worker, so a process-local cache is
+rejected with ``ImproperlyConfigured`` once replicas are configured.
+Credentials are checked against the primary: the models listed in
+``DATABASE_PRIMARY_MODELS`` (tokens and sessions by default) are never read
+from a replica. A token issued by register or login, before the client has
+anything to be pinned by, is therefore found on the very next request.
+
+To try it locally with two SQLite files, copy ``db.sqlite3`` to
+``replica.sqlite3`` and add::
+
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+``TEST.MIRROR`` makes the replica alias share the test database; test
+cases that read through it must include it in their ``databases``.
+"""
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+
+from .caches import is_shared
+
+# Per-request routing state. Mutable, so a write made on another thread
+# (e.g. an async view's sync_to_async ORM call) is seen by the middleware.
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def replica_aliases():
+    return _setting('DATABASE_REPLICAS', [])
+
+
+def primary_models():
+    return _setting('DATABASE_PRIMARY_MODELS', ['authtoken.token', 'sessions.session'])
+
+
+class RequestState:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+    @property
+    def primary(self):
+        return self.replica is None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Follow relations on the database the instance came from.
+            return instance._state.db
+        state = _request_state.get()
+        if state is None or state.primary or model._meta.label_lower in primary_models():
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+            state.replica = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        return db not in replica_aliases()
+
+
+def _client_key(request):
+    credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'db:pin:' + hashlib.sha256(credential.encode()).hexdigest()
+
+
+class ReplicaStickinessMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if replica_aliases() and not is_shared():
+            raise ImproperlyConfigured(
+                'DATABASE_REPLICAS needs a default cache shared by all workers '
+                'to pin clients to the primary after a write.'
+            )
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _state(self, request, pinned):
+        replicas = replica_aliases()
+        if pinned or not replicas or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return RequestState(None)
+        return RequestState(random.choice(replicas))
+
+    def _pin_after(self, key, state):
+        return key is not None and state.wrote and bool(replica_aliases())
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        key = _client_key(request)
+        pinned = bool(key and replica_aliases()) and cache.get(key) is not None
+        state = self._state(request, pinned)
+        token = _request_state.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            _request_state.reset(token)
+            if self._pin_after(key, state):
+                cache.set(key, True, _setting('DATABASE_REPLICA_PIN_SECONDS', 5))
+
+    async def __acall__(self, request):
+        key = _client_key(request)
+        pinned = bool(key and replica_aliases()) and await cache.aget(key) is not None
+        state = self._state(request, pinned)
+        token = _request_state.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+            if self._pin_after(key, state):
+                await cache.aset(key, True, _setting('DATABASE_REPLICA_PIN_SECONDS', 5))
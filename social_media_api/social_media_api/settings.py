@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,7 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'social_media_api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'social_media_api.compression.CompressionMiddleware',
+    'social_media_api.replicas.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,13 +81,41 @@ WSGI_APPLICATION = 'social_media_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Run on every new SQLite connection.
+SQLITE_PRAGMAS = ['mmap_size=134217728', 'cache_size=-20000', 'temp_store=MEMORY']
+# WAL lets readers proceed alongside the single writer and, with
+# synchronous=NORMAL, fsyncs only at checkpoints. Unlike the pragmas above,
+# journal_mode is stored in the database file, so it is opt-in: set
+# SQLITE_WAL=1 in production, and leave it unset to keep the db.sqlite3
+# checked into the repository as it is.
+SQLITE_WAL = os.environ.get('SQLITE_WAL') == '1'
+if SQLITE_WAL:
+    SQLITE_PRAGMAS = ['journal_mode=WAL', 'synchronous=NORMAL'] + SQLITE_PRAGMAS
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # IMMEDIATE takes the write lock at BEGIN, so concurrent
+        # transactions wait out `timeout` seconds instead of failing with
+        # "database is locked" when a read upgrades to a write.
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {pragma}' for pragma in SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Aliases in DATABASES that are read replicas of 'default'; see
+# social_media_api.replicas for setting one up locally.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['social_media_api.replicas.ReplicaRouter']
+# Seconds a client keeps reading from the primary after it writes.
+DATABASE_REPLICA_PIN_SECONDS = 5
+# Models always read from the primary, so new credentials work at once.
+DATABASE_PRIMARY_MODELS = ['authtoken.token', 'sessions.session']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +153,34 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+
+# Cache
+# Per-process memory by default; point this at Redis/Memcached in production
+# so cached counters are shared between workers. Until then, code that needs
+# a shared cache (e.g. the unread notification counter) checks
+# social_media_api.caches.is_shared and reads the database instead.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'social-media-api',
+    },
+    # Stored responses for Idempotency-Key retries, bounded by MAX_ENTRIES.
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'social-media-api-idempotency',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Idempotency-Key support (social_media_api.idempotency)
+IDEMPOTENCY_CACHE = 'idempotency'
+# How long a stored response answers retries.
+IDEMPOTENCY_TTL = 24 * 60 * 60
+# Concurrent duplicates wait this long for the first request's response...
+IDEMPOTENCY_LOCK_WAIT = 5
+# ...and a crashed request's lock expires after this many seconds.
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -129,8 +189,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Django REST Framework settings
 REST_FRAMEWORK = {
+    # orjson-backed when installed, DRF's json otherwise.
+    'DEFAULT_RENDERER_CLASSES': [
+        'social_media_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'social_media_api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -140,5 +210,81 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 }
 
+# Keyset-paginated endpoints accept ?page_size= up to this limit.
+KEYSET_MAX_PAGE_SIZE = 100
+FEED_PAGE_SIZE = 20
+
+
+AUTH_USER_MODEL = 'accounts.User'
+
+
+# Feed timelines (fan-out-on-write)
+# Authors with at least this many followers are merged in at read time.
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+# Number of recent posts copied into a timeline on follow.
+TIMELINE_BACKFILL_SIZE = 100
+
+
+# Most users accepted by one bulk follow/unfollow request.
+FOLLOW_BULK_MAX = 500
+
+
+# In-memory follow graph (accounts.graph)
+# Seconds before a process rebuilds the graph (in a background thread) to pick
+# up other workers' follows.
+FOLLOW_GRAPH_TTL = 300
+# Follows/unfollows applied incrementally before a full reload.
+FOLLOW_GRAPH_MAX_CHANGES = 10000
+
+
+# Trending posts (posts.trending)
+# Seconds after which a like or comment counts half as much.
+TRENDING_HALF_LIFE = 6 * 3600
+TRENDING_LIKE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 2.0
+# Number of posts kept in the cached top-K, and seconds before it is
+# reloaded from the database.
+TRENDING_SIZE = 100
+TRENDING_REFRESH = 300
+# Scores are rescaled once the epoch is this many seconds old.
+TRENDING_RENORMALIZE_AFTER = 7 * 24 * 3600
+# `manage.py rebuild_trending` replays likes and comments this recent.
+TRENDING_HISTORY = 7 * 24 * 3600
+
+
+# Notification outbox, drained by `manage.py process_notifications`
+NOTIFICATIONS_BATCH_SIZE = 500
+NOTIFICATIONS_MAX_ATTEMPTS = 5
+# Base retry delay in seconds, doubled after every failed attempt.
+NOTIFICATIONS_RETRY_DELAY = 30
+# Claimed jobs not finished within this many seconds are handed out again.
+NOTIFICATIONS_LEASE_SECONDS = 300
+# Same recipient/verb/target events within this many seconds share one row.
+NOTIFICATIONS_AGGREGATE_WINDOW = 3600
+NOTIFICATIONS_SAMPLE_ACTORS = 3
+# Seconds the cached unread counter may live before being recounted.
+NOTIFICATIONS_UNREAD_TTL = 300
+
+
+# Token authentication cache (accounts.authentication)
+TOKEN_CACHE_MAXSIZE = 10000
+# Seconds a resolved token is trusted before it is looked up again.
+TOKEN_CACHE_TTL = 60
+# Seconds a worker trusts its own in-process copy; this bounds how long a
+# revoked token keeps working on workers other than the one revoking it.
+TOKEN_CACHE_LOCAL_TTL = 5
+
+
+# Response compression (social_media_api.compression); brotli is used when
+# the `brotli` package is installed, gzip otherwise.
+COMPRESSION_MIN_LENGTH = 200
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 4
+
 
-AUTH_USER_MODEL = 'accounts.User'
\ No newline at end of file
+# Request metrics (social_media_api.metrics), scraped from /metrics.
+# Fraction of requests whose database queries are counted and timed.
+METRICS_DB_SAMPLE_RATE = 0.1
+# Addresses allowed to scrape /metrics; staff users may always read it.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']